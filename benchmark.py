@@ -0,0 +1,279 @@
+"""Headless rendering benchmark.
+
+    python benchmark.py                                  # every scripted path at 1920x1080
+    python benchmark.py --paths deep_zoom hover --size 1280x720 --json bench.json
+    python benchmark.py --replay session.json            # recorded with main.py --record
+
+Runs the running view's draw path (tile compositor, bloom, subnet borders,
+RDAP panels, HUD, context menu) under SDL's dummy video driver and reports the
+frame-time distribution, per-stage timings, tile-cache hit rates, bytes
+decoded and peak RSS for each camera path. Each path starts with cold tile
+caches unless --warm is given. RDAP lookups are not sent unless --rdap is given,
+so panels only show what is already cached.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame
+from config import *
+from cache import (clear_tile_caches, pump_tile_loads, inflight_count, tile_cache_stats, set_tile_source,
+                   set_manifest, stop_tile_workers)
+from bloom import Bloom
+from camera import Camera
+from compositor import TileCompositor
+from context import ContextMenu
+from framestats import FrameStats, percentile
+from hilbert import xy2d, d2xy, int_to_ipv4
+from panels import register_panels_for_mouse, schedule_rdap_lookups, render_panels
+from prefetch import Prefetcher
+from replay import load_recording
+from startup import normalize_directory, select_tile_source, check_manifest
+from tiles import draw_subnet_border, level_for_zoom
+from ui import create_font, render_ip_octets, hud_render
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+N = 1 << HILBERT_ORDER
+ZOOM_STEPS = round(math.log(MAX_ZOOM / MIN_ZOOM, ZOOM_FACTOR))
+
+def _start_centered(w, h, wx, wy, zoom):
+    return (wx - w / 2 / zoom, wy - h / 2 / zoom, zoom)
+
+def _wheel(y):
+    return pygame.event.Event(pygame.MOUSEWHEEL, x=0, y=y)
+
+def deep_zoom_path(w, h, ip="8.8.8.8", hold=12):
+    """Wheel from MIN_ZOOM to MAX_ZOOM onto a single address, letting tiles arrive between steps."""
+    a, b, c, d = (int(p) for p in ip.split("."))
+    hx, hy = d2xy(N, (a << 24) | (b << 16) | (c << 8) | d)
+    mouse = (w // 2, h // 2)
+    frames = []
+    for _ in range(ZOOM_STEPS):
+        frames += [(mouse, [_wheel(1)])] + [(mouse, [])] * hold
+    return _start_centered(w, h, hx + 0.5, hy + 0.5, MIN_ZOOM), frames + [(mouse, [])] * 30
+
+def level0_pan_path(w, h, strokes=16, steps=40):
+    """Long drag across level 0, re-grabbing the map every `steps` frames."""
+    frames, y = [], h // 2
+    x0, x1 = int(w * 0.85), int(w * 0.15)
+    for s in range(strokes):
+        dy = 3 if s % 2 else -3
+        frames.append(((x0, y), [pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=(x0, y))]))
+        pos = (x0, y)
+        for i in range(1, steps + 1):
+            new = (x0 + (x1 - x0) * i // steps, y + dy * i)
+            frames.append((new, [pygame.event.Event(pygame.MOUSEMOTION, pos=new, rel=(new[0] - pos[0], new[1] - pos[1]), buttons=(1, 0, 0))]))
+            pos = new
+        frames.append((pos, [pygame.event.Event(pygame.MOUSEBUTTONUP, button=1, pos=pos)]))
+    return _start_centered(w, h, N / 4, N / 2, 1.0), frames
+
+def zoom_sweep_path(w, h, hold=4):
+    """MIN_ZOOM to MAX_ZOOM and back around an off-centre anchor."""
+    mouse = (w // 3, h // 3)
+    frames = []
+    for direction in (1, -1):
+        for _ in range(ZOOM_STEPS):
+            frames += [(mouse, [_wheel(direction)])] + [(mouse, [])] * hold
+    return _start_centered(w, h, N / 2, N / 2, MIN_ZOOM), frames
+
+def hover_path(w, h, count=400, menu_every=50):
+    """Jump the cursor across /24s at a zoom where subnet panels show, opening and closing the context menu."""
+    frames = []
+    for i in range(count):
+        mouse = ((i * 97) % (w - 320) + 10, (i * 61) % (h - 240) + 10)
+        events = [pygame.event.Event(pygame.MOUSEMOTION, pos=mouse, rel=(0, 0), buttons=(0, 0, 0))]
+        if i % menu_every == menu_every - 1:
+            events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=3, pos=mouse))
+        elif i % menu_every == 10:
+            events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=(w - 5, h - 5)))
+            events.append(pygame.event.Event(pygame.MOUSEBUTTONUP, button=1, pos=(w - 5, h - 5)))
+        frames.append((mouse, events))
+    return _start_centered(w, h, N / 2 + 1000, N / 2 - 3000, 4.0), frames
+
+PATHS = {"deep_zoom": deep_zoom_path, "level0_pan": level0_pan_path,
+         "zoom_sweep": zoom_sweep_path, "hover": hover_path}
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+def drain_tile_loads(timeout=10.0):
+    deadline = time.time() + timeout
+    while inflight_count() and time.time() < deadline:
+        pump_tile_loads()
+        time.sleep(0.005)
+
+class BenchView:
+    """The running view's draw path without the window, menus or quality governor."""
+    def __init__(self, screen, bloom=True, rdap=False):
+        self.screen = screen
+        self.w, self.h = screen.get_size()
+        self.cam = Camera(self.w, self.h)
+        self.compositor = TileCompositor(self.w, self.h)
+        self.prefetcher = Prefetcher(self.w, self.h)
+        self.bloom = Bloom(self.w, self.h) if bloom else None
+        self.context_menu = ContextMenu()
+        self.rdap = rdap
+        self.hud_font, self.ip_font = create_font(18), create_font(48)
+        self.octet_cache, self.panel_text_cache, self.hud_cache = {}, {}, {}
+        self.clock = pygame.time.Clock()
+        self.last_lookup_time = 0.0
+
+    def reset(self, start):
+        self.cam.x, self.cam.y, self.cam.zoom = start
+        self.cam.dragging = False
+        self.cam.history.clear()
+        self.context_menu.hide()
+        self.compositor.invalidate()
+
+    def _address_at(self, pos):
+        cam = self.cam
+        hx = int(max(0, min(N - 1, cam.x + pos[0] / cam.zoom)))
+        hy = int(max(0, min(N - 1, cam.y + pos[1] / cam.zoom)))
+        d = xy2d(N, hx, hy)
+        return hx, hy, d, int_to_ipv4(d)
+
+    def frame(self, mouse, events, stats):
+        cam, screen, w, h = self.cam, self.screen, self.w, self.h
+        stats.begin()
+        arrived = pump_tile_loads()
+        for ev in events:
+            if ev.type == pygame.MOUSEBUTTONDOWN and ev.button == 3:
+                _, _, d, ip_str = self._address_at(ev.pos)
+                self.context_menu.show(ev.pos, ip_str, d)
+            elif ev.type == pygame.MOUSEBUTTONDOWN and ev.button == 1:
+                if self.context_menu.is_visible and not self.context_menu.handle_click(ev.pos):
+                    self.context_menu.hide()
+            cam.handle_event(ev, mouse)
+        self.context_menu.update()
+        stats.lap("events")
+
+        cam.zoom = max(cam.zoom, MIN_ZOOM)
+        level = level_for_zoom(cam.zoom)
+        self.compositor.update(cam.x, cam.y, cam.zoom, level, arrived)
+        self.prefetcher.update(cam, level)
+        stats.lap("tiles")
+
+        hx, hy, d, ip_str = self._address_at(mouse)
+        panels = register_panels_for_mouse(hx, hy, cam.x, cam.y, cam.zoom, w, h, d, ip_str)
+        if self.rdap:
+            self.last_lookup_time = schedule_rdap_lookups(ip_str, panels, self.last_lookup_time, LOOKUP_DEBOUNCE)
+        stats.lap("hover")
+
+        layer = self.compositor.output()
+        screen.blit(layer, (0, 0))
+        stats.lap("blit")
+        if self.bloom:
+            self.bloom.update(layer, self.compositor.version)
+            self.bloom.apply(screen)
+        stats.lap("bloom")
+
+        for bs in (BLOCK_SIZE_32, BLOCK_SIZE_24, BLOCK_SIZE_16, BLOCK_SIZE_8):
+            draw_subnet_border(screen, cam.x, cam.y, cam.zoom, w, h, (hx // bs) * bs, (hy // bs) * bs, bs)
+        stats.lap("borders")
+
+        self.octet_cache = render_ip_octets(screen, ip_str, h, self.ip_font, self.octet_cache)
+        render_panels(screen, panels, cam.x, cam.y, cam.zoom, w, h, self.panel_text_cache, d, ip_str)
+        stats.lap("panels")
+        hud_render(screen, self.hud_font, self.clock, self.hud_cache, cam.zoom, level)
+        stats.lap("hud")
+        self.context_menu.draw(screen)
+        stats.lap("menu")
+        pygame.display.flip()
+        stats.lap("flip")
+        stats.end()
+        self.clock.tick()
+
+def _cache_counts():
+    s = tile_cache_stats()
+    return {"raw": (s["raw"]["hits"], s["raw"]["misses"]), "scaled": (s["scaled"]["hits"], s["scaled"]["misses"]),
+            "decoded": s["decoded"]}
+
+def run_path(view, name, start, frames, warm=False, fps=0):
+    if not warm:
+        drain_tile_loads()
+        clear_tile_caches()
+    view.reset(start)
+    before = _cache_counts()
+    stats = FrameStats(window=len(frames))
+    clock = pygame.time.Clock()
+    t0 = time.perf_counter()
+    for mouse, events in frames:
+        view.frame(mouse, events, stats)
+        if fps:
+            clock.tick(fps)
+    elapsed = time.perf_counter() - t0
+    after = _cache_counts()
+
+    totals = sorted(f["total"] for f in stats.frames)
+    hit_rates = {}
+    for cache in ("raw", "scaled"):
+        hits, misses = after[cache][0] - before[cache][0], after[cache][1] - before[cache][1]
+        hit_rates[cache] = hits / (hits + misses) if hits + misses else 0.0
+    return {"path": name, "frames": len(totals), "seconds": elapsed,
+            "frame_ms": {"avg": sum(totals) / len(totals), "p50": percentile(totals, 50), "p95": percentile(totals, 95),
+                         "p99": percentile(totals, 99), "max": totals[-1]},
+            "stages": stats.summary(), "hit_rate": hit_rates,
+            "decoded_tiles": after["decoded"]["tiles"] - before["decoded"]["tiles"],
+            "decoded_bytes": after["decoded"]["bytes"] - before["decoded"]["bytes"],
+            "peak_rss_mb": peak_rss_mb()}
+
+def print_result(r):
+    f = r["frame_ms"]
+    rss = f"{r['peak_rss_mb']:.0f} MiB" if r["peak_rss_mb"] is not None else "n/a"
+    print(f"{r['path']}: {r['frames']} frames in {r['seconds']:.2f}s")
+    print(f"  frame ms   avg {f['avg']:.2f}  p50 {f['p50']:.2f}  p95 {f['p95']:.2f}  p99 {f['p99']:.2f}  max {f['max']:.2f}")
+    print("  stages     " + "  ".join(f"{stage} {s['avg']:.2f}/{s['p95']:.2f}" for stage, s in r["stages"].items() if stage != "total"))
+    print(f"  tile hits  raw {r['hit_rate']['raw']:.1%}  scaled {r['hit_rate']['scaled']:.1%}")
+    print(f"  decoded    {r['decoded_tiles']} tiles, {r['decoded_bytes'] / 2**20:.1f} MiB   peak RSS {rss}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the viewer's rendering headlessly.")
+    parser.add_argument("--size", default="1920x1080", help="screen resolution, WxH (replays use the recorded size)")
+    parser.add_argument("--paths", nargs="+", choices=sorted(PATHS), default=list(PATHS), help="scripted camera paths to run")
+    parser.add_argument("--replay", metavar="PATH", help="replay a session recorded with main.py --record instead")
+    parser.add_argument("--warm", action="store_true", help="keep tile caches between paths")
+    parser.add_argument("--no-bloom", action="store_true", help="benchmark without bloom")
+    parser.add_argument("--rdap", action="store_true", help="send RDAP lookups while hovering")
+    parser.add_argument("--fps", type=int, default=0, help="pace frames like the viewer does (default: unpaced)")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    normalize_directory()
+    if args.replay:
+        size, start, frames = load_recording(args.replay)
+        runs = [(os.path.basename(args.replay), start, frames)]
+    else:
+        size = tuple(int(v) for v in args.size.lower().split("x"))
+    pygame.init()
+    screen = pygame.display.set_mode(size)
+    source = select_tile_source()
+    set_tile_source(source)
+    set_manifest(check_manifest(source))
+    print(f"{size[0]}x{size[1]}, tiles from {source.name}")
+    if not args.replay:
+        runs = [(name, *PATHS[name](*size)) for name in args.paths]
+
+    view = BenchView(screen, bloom=BLOOM_ENABLED and not args.no_bloom, rdap=args.rdap)
+    results = []
+    for name, start, frames in runs:
+        results.append(run_path(view, name, start, frames, args.warm, args.fps))
+        print_result(results[-1])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"size": list(size), "source": source.name, "results": results}, f, indent=1)
+    stop_tile_workers()
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import numpy as np
+import pygame
+from config import BLOOM_STRENGTH, BLOOM_RADIUS, BLOOM_DOWNSCALE
+
+def _box_blur(a, r, axis):
+    # Running-sum box filter with clamped edges; cost is independent of r.
+    pad = [(0, 0)] * a.ndim
+    pad[axis] = (r + 1, r)
+    c = np.cumsum(np.pad(a, pad, mode="edge"), axis=axis, dtype=np.int32)
+    n = a.shape[axis]
+    hi, lo = [slice(None)] * a.ndim, [slice(None)] * a.ndim
+    hi[axis], lo[axis] = slice(2 * r + 1, 2 * r + 1 + n), slice(0, n)
+    return (c[tuple(hi)] - c[tuple(lo)]) // (2 * r + 1)
+
+class Bloom:
+    """Glow for the tile layer, computed at 1/BLOOM_DOWNSCALE resolution.
+
+    All buffers live across frames, and the glow is only recomputed when the
+    tile layer's version changes - cursor-only frames reuse the last result.
+    """
+    def __init__(self, screen_w: int, screen_h: int, strength=BLOOM_STRENGTH, radius=BLOOM_RADIUS, downscale=BLOOM_DOWNSCALE):
+        self.size = (screen_w, screen_h)
+        self.small_size = (max(1, screen_w // downscale), max(1, screen_h // downscale))
+        self.small = pygame.Surface(self.small_size).convert()
+        self.glow = pygame.Surface(self.size).convert()
+        self.strength = max(0.0, min(1.0, strength))
+        self.blur_radius = max(1, int(radius) // downscale)
+        self.source_version = None
+
+    def update(self, layer: pygame.Surface, version) -> bool:
+        if version == self.source_version:
+            return False
+        pygame.transform.smoothscale(layer, self.small_size, self.small)
+        px = pygame.surfarray.pixels3d(self.small)
+        # Two box passes per axis approximate a gaussian.
+        blurred = px.astype(np.int32)
+        for axis in (0, 1):
+            blurred = _box_blur(_box_blur(blurred, self.blur_radius, axis), self.blur_radius, axis)
+        px[...] = blurred * int(self.strength * 256) >> 8
+        del px
+        pygame.transform.smoothscale(self.small, self.size, self.glow)
+        self.source_version = version
+        return True
+
+    def apply(self, screen: pygame.Surface) -> None:
+        screen.blit(self.glow, (0, 0), special_flags=pygame.BLEND_RGB_ADD)
@@ -0,0 +1,155 @@
+"""Build the level{N}/tile_{x}_{y}.png pyramid (or a packed archive) from survey data.
+
+    python build_pyramid.py survey.bin                  # per-IP dataset, see datasource.py
+    python build_pyramid.py responsive.txt --pack tiles.vtp
+
+Level 0 is rendered straight from the dataset along the Hilbert curve, every
+coarser level is a 2x2 reduction of the one below. Work is spread over a process
+pool; finished tiles are written atomically and skipped on the next run, so an
+interrupted build can simply be restarted.
+"""
+import argparse
+import gzip
+import multiprocessing
+import os
+import re
+import sys
+import time
+import numpy as np
+import pygame
+from config import TILE_SIZE, MAX_LEVEL, HILBERT_ORDER, TILE_DATA_PATH
+from datasource import IPDataset, make_colormap, render_tile_rgb
+from hilbert import d2xy
+from tile_sources import DirectoryTileSource, tile_filename
+from tilepack import write_pack
+
+IPV4_RE = re.compile(rb"(?<![\d.])(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})(?![\d.])")
+TASK_TILES = 64
+
+def open_text(path):
+    with open(path, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    return gzip.open(path, "rb") if gzipped else open(path, "rb")
+
+def read_address_batches(path, batch=1 << 20):
+    """Yield uint32 arrays of the first IPv4 address found on each line."""
+    out = []
+    with open_text(path) as f:
+        for line in f:
+            if line.startswith(b"#"):
+                continue
+            if m := IPV4_RE.search(line):
+                a, b, c, d = (int(g) for g in m.groups())
+                if a < 256 and b < 256 and c < 256 and d < 256:
+                    out.append(a << 24 | b << 16 | c << 8 | d)
+            if len(out) >= batch:
+                yield np.array(out, dtype=np.uint32)
+                out = []
+    if out:
+        yield np.array(out, dtype=np.uint32)
+
+def tile_keys(level):
+    """All tiles of a level, in Hilbert order so neighbouring work reads neighbouring data."""
+    tile_world = TILE_SIZE << level
+    n = max(1, (1 << HILBERT_ORDER) // tile_world)
+    return [(x * tile_world, y * tile_world) for x, y in (d2xy(n, d) for d in range(n * n))]
+
+def parent_keys(keys, level):
+    """Tiles of `level` covering the given tiles of `level - 1`."""
+    pw = TILE_SIZE << level
+    return sorted({(tx // pw * pw, ty // pw * pw) for tx, ty in keys})
+
+_worker = {}
+
+def _init_worker(dataset_path, out):
+    _worker.update(out=out, colormap=make_colormap(),
+                   dataset=IPDataset(dataset_path) if dataset_path else None)
+
+def _save(surf, fn):
+    tmp = fn[:-4] + ".tmp.png"
+    pygame.image.save(surf, tmp)
+    os.replace(tmp, fn)
+
+def _load_rgb(fn):
+    try:
+        return pygame.surfarray.array3d(pygame.image.load(fn))
+    except Exception:
+        return np.zeros((TILE_SIZE, TILE_SIZE, 3), dtype=np.uint8)
+
+def _render_tiles(task):
+    level, keys, force = task
+    out, written = _worker["out"], 0
+    for tx, ty in keys:
+        fn = os.path.join(out, tile_filename(level, tx, ty))
+        if not force and os.path.isfile(fn):
+            continue
+        if level == 0:
+            rgb = render_tile_rgb(_worker["dataset"], 0, tx, ty, _worker["colormap"]).swapaxes(0, 1)
+        else:
+            half = TILE_SIZE << (level - 1)
+            quad = np.empty((TILE_SIZE * 2, TILE_SIZE * 2, 3), dtype=np.uint16)
+            for i, j in ((0, 0), (1, 0), (0, 1), (1, 1)):
+                child = os.path.join(out, tile_filename(level - 1, tx + i * half, ty + j * half))
+                quad[i * TILE_SIZE:(i + 1) * TILE_SIZE, j * TILE_SIZE:(j + 1) * TILE_SIZE] = _load_rgb(child)
+            rgb = ((quad.reshape(TILE_SIZE, 2, TILE_SIZE, 2, 3).sum(axis=(1, 3)) + 2) // 4).astype(np.uint8)
+        _save(pygame.surfarray.make_surface(rgb), fn)
+        written += 1
+    return len(keys), written
+
+def build_pyramid(dataset_path, out=".", keys=None, jobs=None, force=False, log=print):
+    """Render the given level-0 tiles (default: all) and every ancestor up to MAX_LEVEL.
+
+    Returns {level: [(tx, ty), ...]} of the tiles that were considered.
+    """
+    keys = tile_keys(0) if keys is None else sorted(keys)
+    touched = {}
+    with multiprocessing.Pool(jobs, initializer=_init_worker, initargs=(dataset_path, out)) as pool:
+        for level in range(MAX_LEVEL + 1):
+            if level:
+                keys = parent_keys(keys, level)
+            touched[level] = keys
+            os.makedirs(os.path.join(out, f"level{level}"), exist_ok=True)
+            tasks = [(level, keys[i:i + TASK_TILES], force) for i in range(0, len(keys), TASK_TILES)]
+            t0, seen, written = time.perf_counter(), 0, 0
+            for n, w in pool.imap_unordered(_render_tiles, tasks):
+                seen, written = seen + n, written + w
+            dt = time.perf_counter() - t0
+            log(f"level{level}: {written} written, {seen - written} already done, "
+                f"{written / dt if dt > 0 else 0:.0f} tiles/s")
+    return touched
+
+def load_dataset(path, store):
+    """Open `path` as a dataset, or build a bitset at `store` from a list of addresses."""
+    if IPDataset.available(path):
+        return path
+    dataset = IPDataset.create(store, "bitset")
+    total = 0
+    for addrs in read_address_batches(path):
+        np.bitwise_or.at(dataset.data, addrs >> 3, (0x80 >> (addrs & 7)).astype(np.uint8))
+        total += len(addrs)
+    dataset.data.flush()
+    print(f"{store}: marked {total} addresses from {path}")
+    return store
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the tile pyramid from raw survey data.")
+    parser.add_argument("input", help="per-IP dataset (2**32 or 2**29 bytes) or a text/gzip list of responsive addresses")
+    parser.add_argument("--store", default=TILE_DATA_PATH, help="bitset to create when input is an address list")
+    parser.add_argument("--out", default=".", help="directory receiving level0..level8")
+    parser.add_argument("--pack", help="also write a packed archive (see tilepack.py)")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="re-render tiles that already exist")
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.input):
+        sys.exit(f"{args.input} not found")
+    t0 = time.perf_counter()
+    dataset_path = load_dataset(args.input, args.store)
+    build_pyramid(dataset_path, args.out, jobs=args.jobs, force=args.force)
+    if args.pack:
+        write_pack(DirectoryTileSource(args.out), args.pack)
+        print(f"Wrote {args.pack}")
+    print(f"Done in {time.perf_counter() - t0:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,17 @@
+import itertools
+import json
 import os
-from collections import OrderedDict
+import queue
+import threading
+from collections import Counter, OrderedDict
 import pygame
-from config import MAX_CACHE_ITEMS
+from config import (TILE_SIZE, MAX_LEVEL, MAX_CACHE_ITEMS, TILE_CACHE_BYTES, NEGATIVE_CACHE_ITEMS,
+                    TILE_DECODE_WORKERS, MAX_INFLIGHT_DECODES, MAX_INFLIGHT_PREFETCH,
+                    TILE_INVALIDATION_LOG, TILE_PALETTED)
+from manifest import TileManifest
+from palette import SharedPalette
+from profiler import span
+from tile_sources import DirectoryTileSource
 
 class LRUCache:
     def __init__(self, max_items=MAX_CACHE_ITEMS):
@@ -25,45 +35,401 @@ class LRUCache:
     def clear(self):
         self.od.clear()
 
-_tile_cache = LRUCache()
-_scaled_tile_cache = LRUCache(max_items=MAX_CACHE_ITEMS * 4)
+def surface_nbytes(surf):
+    return surf.get_pitch() * surf.get_height() if surf is not None else 0
+
+class CacheBudget:
+    """Byte budget shared by several SizedLRUCaches, evicting the globally oldest entry."""
+    def __init__(self, max_bytes=TILE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.caches = []
+        self._clock = 0
+
+    def tick(self):
+        self._clock += 1
+        return self._clock
+
+    def enforce(self, keep=None):
+        while self.bytes > self.max_bytes:
+            oldest = None
+            for c in self.caches:
+                if c.od and (oldest is None or c.oldest_stamp() < oldest.oldest_stamp()):
+                    oldest = c
+            if oldest is None or (len(oldest.od) == 1 and next(iter(oldest.od)) == keep):
+                break
+            oldest.evict_oldest()
+
+class SizedLRUCache:
+    """LRU cache accounted by pixel-buffer size. Missing tiles (None) live in a
+    separate, count-limited table so they never push real surfaces out."""
+    def __init__(self, budget, max_negative=NEGATIVE_CACHE_ITEMS, size_of=surface_nbytes):
+        self.budget, self.size_of = budget, size_of
+        self.max_negative = max_negative
+        self.od = OrderedDict()
+        self.negative = OrderedDict()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        budget.caches.append(self)
+
+    def get(self, key):
+        if (entry := self.od.get(key)) is not None:
+            self.od[key] = (entry[0], entry[1], self.budget.tick())
+            self.od.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if key in self.negative:
+            self.negative.move_to_end(key)
+            self.hits += 1
+            return None
+        self.misses += 1
+
+    def put(self, key, value):
+        self.discard(key)
+        if value is None:
+            self.negative[key] = True
+            if len(self.negative) > self.max_negative:
+                self.negative.popitem(last=False)
+            return
+        size = self.size_of(value)
+        self.od[key] = (value, size, self.budget.tick())
+        self.bytes += size
+        self.budget.bytes += size
+        self.budget.enforce(keep=key)
+
+    def contains(self, key):
+        return key in self.od or key in self.negative
+
+    def peek(self, key):
+        """Value for key without touching the LRU order or the hit/miss counters."""
+        return entry[0] if (entry := self.od.get(key)) is not None else None
+
+    def discard(self, key):
+        self.negative.pop(key, None)
+        if (entry := self.od.pop(key, None)) is not None:
+            self.bytes -= entry[1]
+            self.budget.bytes -= entry[1]
+
+    def discard_where(self, pred):
+        for key in [k for k in self.od if pred(k)] + [k for k in self.negative if pred(k)]:
+            self.discard(key)
+
+    def oldest_stamp(self):
+        return next(iter(self.od.values()))[2]
+
+    def evict_oldest(self):
+        _, (_, size, _) = self.od.popitem(last=False)
+        self.bytes -= size
+        self.budget.bytes -= size
+        self.evictions += 1
+
+    def clear(self):
+        self.budget.bytes -= self.bytes
+        self.bytes = 0
+        self.od.clear()
+        self.negative.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "items": len(self.od), "negative_items": len(self.negative), "bytes": self.bytes}
+
+_tile_budget = CacheBudget()
+_tile_cache = SizedLRUCache(_tile_budget)
+_scaled_tile_cache = SizedLRUCache(_tile_budget)
+
+_decoded = {"tiles": 0, "bytes": 0}
+
+def tile_cache_stats():
+    return {"raw": _tile_cache.stats(), "scaled": _scaled_tile_cache.stats(),
+            "bytes": _tile_budget.bytes, "budget": _tile_budget.max_bytes, "decoded": dict(_decoded)}
+
+# Tiles are decoded off the main thread. The frame loop only ever enqueues
+# requests and drains finished decodes via pump_tile_loads(). Requests for the
+# current frame outrank prefetches; prefetches from an outdated prediction are
+# dropped by the workers when they reach the front of the queue.
+TILE_PENDING = object()
+TILE_CANCELLED = object()
+TILE_WORKER_SHUTDOWN = object()
+PRIORITY_DEMAND, PRIORITY_PREFETCH, PRIORITY_WARM = 0, 1, 2
+_tile_requests = queue.PriorityQueue()
+_tile_ready = queue.Queue()
+_request_seq = itertools.count()
+_inflight = {}
+_inflight_counts = [0, 0, 0]
+_claimed, _claim_lock = set(), threading.Lock()
+_prefetch_generation = 0
+_prefetch_keys = []
+_warm_backlog = []
+_access_counts = Counter()
+
+_tile_source = DirectoryTileSource()
+
+def set_tile_source(source, clear=True):
+    global _tile_source
+    _tile_source = source
+    if clear:
+        clear_tile_caches()
+
+def get_tile_source():
+    return _tile_source
+
+_manifest = None
+
+def set_manifest(manifest):
+    global _manifest
+    _manifest = manifest
+
+def solid_tile_color(level, tx, ty):
+    return _manifest.solid_color(level, tx, ty) if _manifest is not None else None
+
+tile_palette = SharedPalette()
+
+def _decode_tile(level, tx, ty):
+    source = _tile_source
+    try:
+        surf = source.load(level, tx, ty)
+    except ValueError:
+        # Closed after poll_tile_invalidations swapped in a reopened source; read that one.
+        surf = _tile_source.load(level, tx, ty) if _tile_source is not source else None
+    if surf is not None and TILE_PALETTED:
+        try:
+            surf = tile_palette.to_paletted(surf) or surf
+        except Exception:
+            pass
+    return surf
+
+def _to_display(surf):
+    # Paletted base tiles stay 8-bit in the cache; everything else takes the display format.
+    if TILE_PALETTED and surf.get_bitsize() == 8:
+        return surf
+    return surf.convert()
+
+def tile_worker():
+    while True:
+        priority, _, key, generation = _tile_requests.get()
+        if key is TILE_WORKER_SHUTDOWN:
+            break
+        if priority == PRIORITY_PREFETCH and generation != _prefetch_generation:
+            _tile_ready.put((key, TILE_CANCELLED, generation))
+            continue
+        # Superseded: the key was re-requested at another priority or has already arrived.
+        if _inflight.get(key) != (priority, generation):
+            continue
+        with _claim_lock:
+            # A prefetch upgraded to a demand request sits in the queue twice.
+            if key in _claimed:
+                continue
+            _claimed.add(key)
+        with span("decode", "tiles", key):
+            surf = _decode_tile(*key)
+        if surf is not None:
+            with _claim_lock:
+                _decoded["tiles"] += 1
+                _decoded["bytes"] += surface_nbytes(surf)
+        _tile_ready.put((key, surf, generation))
+
+def _inflight_remove(key):
+    if (entry := _inflight.pop(key, None)) is not None:
+        _inflight_counts[entry[0]] -= 1
+
+def request_tile(key, priority=PRIORITY_DEMAND):
+    if (entry := _inflight.get(key)) is not None and entry[0] <= priority:
+        return
+    limit = MAX_INFLIGHT_DECODES if priority == PRIORITY_DEMAND else MAX_INFLIGHT_PREFETCH
+    if _inflight_counts[priority] >= limit:
+        return
+    _inflight_remove(key)
+    _inflight[key] = (priority, _prefetch_generation)
+    _inflight_counts[priority] += 1
+    _tile_requests.put((priority, next(_request_seq), key, _prefetch_generation))
+
+def prefetch_tiles(keys):
+    """Warm the cache with tiles expected soon, below the current frame's requests.
+
+    A changed key list cancels whatever is still queued from the previous one;
+    calling again with the same list only tops up requests that hit the cap.
+    """
+    global _prefetch_generation, _prefetch_keys
+    keys = [k for k in keys if not _tile_cache.contains(k) and
+            (_manifest is None or (_manifest.exists(*k) and _manifest.solid_color(*k) is None))]
+    if keys != _prefetch_keys:
+        _prefetch_generation += 1
+        _prefetch_keys = keys
+        for key in [k for k, entry in _inflight.items() if entry[0] == PRIORITY_PREFETCH]:
+            _inflight_remove(key)
+    for key in keys:
+        if _inflight_counts[PRIORITY_PREFETCH] >= MAX_INFLIGHT_PREFETCH:
+            break
+        request_tile(key, PRIORITY_PREFETCH)
+
+def warm_tiles(keys):
+    """Queue tiles to load in the background at the lowest priority, e.g. during the title screen."""
+    _warm_backlog.extend(reversed([k for k in keys if _manifest is None or
+                                   (_manifest.exists(*k) and _manifest.solid_color(*k) is None)]))
+
+def _top_up_warm():
+    while _warm_backlog and _inflight_counts[PRIORITY_WARM] < MAX_INFLIGHT_PREFETCH:
+        if not _tile_cache.contains(key := _warm_backlog.pop()):
+            request_tile(key, PRIORITY_WARM)
+
+def tile_access_counts():
+    return _access_counts
+
+def pump_tile_loads():
+    """Move finished decodes into the tile cache. Returns the keys that arrived."""
+    _top_up_warm()
+    loaded = []
+    while True:
+        try:
+            key, surf, generation = _tile_ready.get_nowait()
+        except queue.Empty:
+            break
+        if surf is TILE_CANCELLED:
+            if _inflight.get(key) == (PRIORITY_PREFETCH, generation):
+                _inflight_remove(key)
+            continue
+        _inflight_remove(key)
+        with _claim_lock:
+            _claimed.discard(key)
+        if surf is not None:
+            try:
+                surf = _to_display(surf)
+            except Exception:
+                surf = None
+        _tile_cache.put(key, surf)
+        loaded.append(key)
+    return loaded
+
+def inflight_count():
+    return len(_inflight)
 
 def load_tile(level, tx, ty):
-    key = (level, tx, ty)
+    _access_counts[(level, tx, ty)] += 1
+    return _load_tile((level, tx, ty))
+
+def _load_tile(key):
     if (cached := _tile_cache.get(key)) is not None:
         return cached
-        
-    fn = os.path.join(f"level{level}", f"tile_{tx}_{ty}.png")
-    if not os.path.isfile(fn):
-        _tile_cache.put(key, None)
+    if _tile_cache.contains(key):
         return None
-        
-    try:
-        s = pygame.image.load(fn).convert()
-    except Exception:
-        _tile_cache.put(key, None)
+    if _manifest is not None and not _manifest.exists(*key):
         return None
-            
-    _tile_cache.put(key, s)
-    return s
+
+    request_tile(key)
+    return TILE_PENDING
 
 def get_scaled_tile(level, tx, ty, w, h):
     key = (level, tx, ty, int(w), int(h))
+    _access_counts[key[:3]] += 1
     if cached := _scaled_tile_cache.get(key):
         return cached
         
-    if not (base := load_tile(level, tx, ty)):
+    if (base := _load_tile(key[:3])) is TILE_PENDING:
+        return TILE_PENDING
+    if not base:
         _scaled_tile_cache.put(key, None)
         return None
         
     try:
-        scaled = pygame.transform.scale(base, (int(w), int(h)))
+        with span("scale", "tiles", key):
+            scaled = pygame.transform.scale(base, (int(w), int(h))).convert()
     except Exception:
         scaled = base
         
     _scaled_tile_cache.put(key, scaled)
     return scaled
 
+def find_cached_ancestor(level, tx, ty):
+    """Nearest coarser tile already in memory, with the source rect covering (tx, ty)."""
+    for anc in range(level + 1, MAX_LEVEL + 1):
+        anc_world = TILE_SIZE << anc
+        ax, ay = (tx // anc_world) * anc_world, (ty // anc_world) * anc_world
+        if surf := _tile_cache.peek((anc, ax, ay)):
+            size = max(1, TILE_SIZE >> (anc - level))
+            return anc, surf, pygame.Rect((tx - ax) >> anc, (ty - ay) >> anc, size, size)
+    return None
+
+def get_placeholder_tile(level, tx, ty, w, h):
+    if not (found := find_cached_ancestor(level, tx, ty)):
+        return None
+    anc, surf, src = found
+    key = (level, tx, ty, int(w), int(h), anc)
+    if cached := _scaled_tile_cache.get(key):
+        return cached
+
+    try:
+        scaled = pygame.transform.scale(surf.subsurface(src), (int(w), int(h))).convert()
+    except Exception:
+        return None
+
+    _scaled_tile_cache.put(key, scaled)
+    return scaled
+
+def invalidate_tiles(keys):
+    """Drop specific (level, tx, ty) tiles, their scaled copies and placeholders cut from them."""
+    keys = set(keys)
+    for key in keys:
+        _tile_cache.discard(key)
+
+    def stale(k):
+        if k[:3] in keys:
+            return True
+        if len(k) == 6:
+            anc_world = TILE_SIZE << k[5]
+            return (k[5], k[1] // anc_world * anc_world, k[2] // anc_world * anc_world) in keys
+        return False
+    _scaled_tile_cache.discard_where(stale)
+
+_invalidation_pos = None
+
+def poll_tile_invalidations(path=TILE_INVALIDATION_LOG):
+    """Apply tiles rebuilt by ingest.py since the last call. Returns the invalidated keys."""
+    global _invalidation_pos
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        # No log yet: read the one ingest.py creates later from its start.
+        _invalidation_pos = 0
+        return []
+    if _invalidation_pos is None or size < _invalidation_pos:
+        _invalidation_pos = size
+        return []
+    if size == _invalidation_pos:
+        return []
+
+    with open(path, "rb") as f:
+        f.seek(_invalidation_pos)
+        chunk = f.read(size - _invalidation_pos)
+    complete = chunk[:chunk.rfind(b"\n") + 1]
+    _invalidation_pos += len(complete)
+    keys = []
+    for line in complete.splitlines():
+        try:
+            keys.extend(tuple(k) for k in json.loads(line)["tiles"])
+        except (ValueError, KeyError, TypeError):
+            continue
+    if keys:
+        if hasattr(old := _tile_source, "reopen"):
+            set_tile_source(old.reopen(), clear=False)
+            old.close()
+        if _manifest is not None:
+            try:
+                set_manifest(TileManifest.load(_manifest.path))
+            except (OSError, ValueError):
+                pass
+        invalidate_tiles(keys)
+    return keys
+
 def clear_tile_caches():
     _tile_cache.clear()
-    _scaled_tile_cache.clear()
\ No newline at end of file
+    _scaled_tile_cache.clear()
+
+def stop_tile_workers():
+    for _ in _worker_threads:
+        _tile_requests.put((-1, next(_request_seq), TILE_WORKER_SHUTDOWN, 0))
+
+_worker_threads = [threading.Thread(target=tile_worker, name=f"tile-worker-{i}", daemon=True) for i in range(TILE_DECODE_WORKERS)]
+for _t in _worker_threads:
+    _t.start()
@@ -1,3 +1,5 @@
+import time
+from collections import deque
 import pygame
 from config import HILBERT_ORDER, INITIAL_ZOOM, MIN_ZOOM, MAX_ZOOM, ZOOM_FACTOR
 
@@ -10,10 +12,15 @@ class Camera:
         self.x, self.y = (N / 2) - vw / 2, (N / 2) - vh / 2
         self.dragging = False
         self.last_mouse = (0, 0)
+        # (time, x, y, zoom) after each drag/zoom step, plus the latest wheel
+        # direction and anchor, for predicting where the view is heading.
+        self.history = deque(maxlen=32)
+        self.zoom_dir, self.zoom_time, self.zoom_anchor = 0, 0.0, (screen_w // 2, screen_h // 2)
 
-    def handle_event(self, ev: pygame.event.Event) -> None:
+    def handle_event(self, ev: pygame.event.Event, mouse_pos=None) -> None:
         if ev.type == pygame.MOUSEBUTTONDOWN and ev.button == 1:
             self.dragging, self.last_mouse = True, ev.pos
+            self.history.clear()
         elif ev.type == pygame.MOUSEBUTTONUP and ev.button == 1:
             self.dragging = False
         elif ev.type == pygame.MOUSEMOTION and self.dragging:
@@ -21,10 +28,13 @@ class Camera:
             self.x -= dx / self.zoom
             self.y -= dy / self.zoom
             self.last_mouse = ev.pos
+            self.history.append((time.time(), self.x, self.y, self.zoom))
         elif ev.type == pygame.MOUSEWHEEL:
             old_zoom = self.zoom
             self.zoom = max(MIN_ZOOM, min(MAX_ZOOM, old_zoom * (ZOOM_FACTOR ** ev.y)))
             if abs(self.zoom - old_zoom) > 1e-12:
-                mx, my = pygame.mouse.get_pos()
+                mx, my = mouse_pos or pygame.mouse.get_pos()
                 wx, wy = self.x + mx / old_zoom, self.y + my / old_zoom
-                self.x, self.y = wx - mx / self.zoom, wy - my / self.zoom
\ No newline at end of file
+                self.x, self.y = wx - mx / self.zoom, wy - my / self.zoom
+                self.zoom_dir, self.zoom_time, self.zoom_anchor = (1 if ev.y > 0 else -1), time.time(), (mx, my)
+                self.history.clear()
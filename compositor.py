@@ -0,0 +1,106 @@
+import math
+import pygame
+from tiles import draw_visible_tiles
+from config import TILE_SIZE
+
+class TileCompositor:
+    """Persistent framebuffer for the tile layer.
+
+    Pure pans scroll the previous frame and only draw the newly exposed strips;
+    a zoom or level change recomposites the whole layer once. Tiles arriving for
+    spots drawn from a placeholder (or left empty) redraw just those tiles' rects.
+    `version` increments whenever the pixels change.
+    With a render scale above 1 the layer is drawn at 1/scale size and
+    `output()` upscales it to the screen.
+    """
+    def __init__(self, screen_w: int, screen_h: int):
+        self.screen_w, self.screen_h = screen_w, screen_h
+        self.scale, self.w, self.h = 1, screen_w, screen_h
+        self.surface = pygame.Surface((screen_w, screen_h)).convert()
+        self.upscaled, self.upscaled_version = None, None
+        self.view = None
+        self.pending = set()
+        self.version = 0
+
+    def invalidate(self) -> None:
+        self.view = None
+
+    def set_scale(self, scale: int) -> None:
+        if scale == self.scale:
+            return
+        self.scale = scale
+        self.w, self.h = max(1, self.screen_w // scale), max(1, self.screen_h // scale)
+        self.surface = pygame.Surface((self.w, self.h)).convert()
+        if scale > 1 and self.upscaled is None:
+            self.upscaled = pygame.Surface((self.screen_w, self.screen_h)).convert()
+        self.upscaled_version = None
+        self.invalidate()
+
+    def output(self) -> pygame.Surface:
+        """The tile layer at screen size."""
+        if self.scale == 1:
+            return self.surface
+        if self.upscaled_version != self.version:
+            pygame.transform.scale(self.surface, (self.screen_w, self.screen_h), self.upscaled)
+            self.upscaled_version = self.version
+        return self.upscaled
+
+    def _draw(self, cam_x, cam_y, zoom, level, rect):
+        """Redraw rect; returns the keys of the tiles in it still loading."""
+        self.surface.set_clip(rect)
+        self.surface.fill((0, 0, 0), rect)
+        pending = draw_visible_tiles(self.surface, cam_x, cam_y, zoom, self.w, self.h, level, rect)
+        self.surface.set_clip(None)
+        return pending
+
+    def _scroll(self, cam_x, cam_y, zoom, level, view):
+        if not self.view or self.view[:2] != view[:2]:
+            return False
+        w, h = self.w, self.h
+        dx, dy = self.view[2] - view[2], self.view[3] - view[3]
+        if not (dx.is_integer() and dy.is_integer() and abs(dx) < w and abs(dy) < h):
+            return False
+        dx, dy = int(dx), int(dy)
+        self.surface.scroll(dx, dy)
+        strips = []
+        if dx:
+            strips.append(pygame.Rect(0 if dx > 0 else w + dx, 0, abs(dx), h))
+        if dy:
+            strips.append(pygame.Rect(0, 0 if dy > 0 else h + dy, w, abs(dy)))
+        for rect in strips:
+            self.pending.update(self._draw(cam_x, cam_y, zoom, level, rect))
+        self.view = view
+        return True
+
+    def _redraw_arrived(self, cam_x, cam_y, zoom, level, arrived):
+        """Redraw pending tiles that arrived or gained a closer cached ancestor. Returns whether any did."""
+        arrived = {key for key in arrived if key[0] >= level}
+        levels = {key[0] for key in arrived}
+        hit = [key for key in self.pending
+               if any((anc, key[1] // (TILE_SIZE << anc) * (TILE_SIZE << anc),
+                       key[2] // (TILE_SIZE << anc) * (TILE_SIZE << anc)) in arrived for anc in levels)]
+        size = max(1, int(TILE_SIZE * zoom * (2 ** level))) + 1
+        full = pygame.Rect(0, 0, self.w, self.h)
+        for key in hit:
+            self.pending.discard(key)
+            rect = pygame.Rect(math.floor((key[1] - cam_x) * zoom), math.floor((key[2] - cam_y) * zoom), size, size).clip(full)
+            if rect:
+                self.pending.update(self._draw(cam_x, cam_y, zoom, level, rect))
+        return bool(hit)
+
+    def update(self, cam_x: float, cam_y: float, zoom: float, level: int, arrived=()) -> bool:
+        zoom /= self.scale
+        view = (zoom, level, cam_x * zoom, cam_y * zoom)
+        changed = False
+        if self.view != view:
+            if not self._scroll(cam_x, cam_y, zoom, level, view):
+                self.pending = set(self._draw(cam_x, cam_y, zoom, level, pygame.Rect(0, 0, self.w, self.h)))
+                self.view = view
+                self.version += 1
+                return True
+            changed = True
+        if arrived and self.pending and self._redraw_arrived(cam_x, cam_y, zoom, level, arrived):
+            changed = True
+        if changed:
+            self.version += 1
+        return changed
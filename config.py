@@ -3,7 +3,24 @@ TILE_SIZE = 256
 MAX_LEVEL = 8
 HILBERT_ORDER, ZOOM_FACTOR = 16, 2
 MAX_CACHE_ITEMS = 1024
+TILE_CACHE_BYTES, NEGATIVE_CACHE_ITEMS = 512 * 1024 * 1024, 65536
+TILE_DECODE_WORKERS, MAX_INFLIGHT_DECODES, MAX_INFLIGHT_PREFETCH = 4, 64, 32
+PREFETCH_WINDOW, PREFETCH_HORIZON = 0.2, 0.3  # seconds of input used / looked ahead
+HOTSET_PATH, HOTSET_PER_LEVEL = "hotset.json", 64  # most used tiles, preloaded on the next launch
+TILE_PALETTED = True  # keep cached base tiles as 8-bit surfaces on a shared palette
 MIN_ZOOM, MAX_ZOOM, INITIAL_ZOOM = 1/256, 16, 1/64
+DEEP_ZOOM_SCALE_LIMIT = 1024
+
+# Tile storage - a packed archive (see tilepack.py) is used when present, then the
+# unzipped level{N} directories, then colored.zip read in place
+TILE_PACK_PATH, TILE_ZIP_PATH = "tiles.vtp", "colored.zip"
+TILE_MANIFEST_PATH = "tiles.manifest"
+
+# Per-IP dataset (see datasource.py) - rendered on the fly instead of the PNGs when present
+TILE_DATA_PATH = "survey.bin"
+TILE_INVALIDATION_LOG, TILE_INVALIDATION_POLL = "tiles.invalidate", 1.0
+INGEST_STORE_PATH = "scans.bin"  # ingest.py's own store; the viewer never picks it up
+DATA_COLOR_LOW, DATA_COLOR_HIGH = "#000000", "#6ef2ff"
 
 # Colors
 COLOR_OCTET_1, COLOR_OCTET_2   = "#f76a81", "#85fa6e"
@@ -30,7 +47,26 @@ RDAP_ENDPOINTS = [
     "https://rdap.afrinic.net/rdap/ip/{}",
     "https://client.rdap.org/?object={}&type=ip"
 ]
-RDAP_REQUEST_TIMEOUT, RDAP_WORKER_THROTTLE, LOOKUP_DEBOUNCE = 6.0, 0.05, 0.35
+RDAP_REQUEST_TIMEOUT, LOOKUP_DEBOUNCE = 6.0, 0.35
+RDAP_MAX_CONCURRENCY, RDAP_HOST_CONCURRENCY = 8, 2  # lookups in flight overall / requests in flight per registry host
+# Queries go to the registry named by IANA's bootstrap table first, then down RDAP_ENDPOINTS (python rdap_bootstrap.py refresh)
+RDAP_BOOTSTRAP_PATH, RDAP_BOOTSTRAP_URL = "rdap_bootstrap.json", "https://data.iana.org/rdap/ipv4.json"
+# Responses persist across sessions (python rdap_store.py compact); expired ones are refetched but still shown offline
+RDAP_STORE_PATH, RDAP_CACHE_TTL, RDAP_NEGATIVE_TTL = "rdap_cache.sqlite3", 30 * 86400, 86400
+RDAP_STORE_KEEP_STALE = 365 * 86400
+
+# Render loop: redraw only when dirty, linger past the lookup debounce, then sleep on events
+FRAME_RATE, IDLE_WAIT_MS, IDLE_LINGER = 60, 250, 0.5
+
+# Quality governor: drop a tier after GOVERNOR_DEGRADE_FRAMES over budget, restore after GOVERNOR_RESTORE_FRAMES under HEADROOM * budget
+FRAME_BUDGET_MS, GOVERNOR_HEADROOM, GOVERNOR_SMOOTHING = 1000 / 60, 0.6, 0.2
+GOVERNOR_DEGRADE_FRAMES, GOVERNOR_RESTORE_FRAMES, GOVERNOR_LOW_RES_SCALE = 8, 90, 2
+
+# Frame stats overlay: toggle key, frames kept, panel refresh (s), and where to dump them on exit (.csv/.json, "" = off)
+FRAME_STATS_KEY, FRAME_STATS_WINDOW, FRAME_STATS_REFRESH, FRAME_STATS_PATH = "f3", 600, 0.25, ""
+
+# Profiler capture: toggle key, output prefix (-<timestamp>.json/.txt), stack sampling interval (s), report rows, span cap
+PROFILE_KEY, PROFILE_PATH, PROFILE_SAMPLE_INTERVAL, PROFILE_TOP_N, PROFILE_MAX_EVENTS = "f9", "profile", 0.005, 25, 1_000_000
 
 # Bloom PPE
-BLOOM_ENABLED, BLOOM_STRENGTH, BLOOM_RADIUS = True, 0.5, 16
\ No newline at end of file
+BLOOM_ENABLED, BLOOM_STRENGTH, BLOOM_RADIUS, BLOOM_DOWNSCALE = True, 0.5, 16, 8
\ No newline at end of file
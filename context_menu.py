@@ -3,6 +3,7 @@ import subprocess
 import webbrowser
 from config import *
 from ui import create_font
+from profiler import span
 import os
 
 class ContextMenu:
@@ -16,6 +17,7 @@ class ContextMenu:
         self.options = []
         self.ping_results = {}
         self.active_pings = {}  
+        self.results_version = 0
     def show(self, pos, ip_str, ip_int):
         self.is_visible = True
         self.position = pos
@@ -143,12 +145,13 @@ class ContextMenu:
         def ping_thread(ip):
             try:
                 param = "-n" if os.name == "nt" else "-c"
-                result = subprocess.run(
-                    ["ping", param, "1", ip], 
-                    capture_output=True, 
-                    text=True,
-                    timeout=5
-                )
+                with span("ping", "ping", ip):
+                    result = subprocess.run(
+                        ["ping", param, "1", ip], 
+                        capture_output=True, 
+                        text=True,
+                        timeout=5
+                    )
                 
                 if result.returncode == 0:
                     time_str = "unknown"
@@ -167,9 +170,10 @@ class ContextMenu:
                 self.ping_results[ip] = "failed"
             finally:
                 self.active_pings.pop(ip, None)
+                self.results_version += 1
         
         import threading
-        thread = threading.Thread(target=ping_thread, args=(ip_str,))
+        thread = threading.Thread(target=ping_thread, args=(ip_str,), name=f"ping-{ip_str}")
         thread.daemon = True
         thread.start()
     
@@ -0,0 +1,110 @@
+"""Tiles rendered on demand from a memory-mapped per-address dataset.
+
+Two on-disk formats are recognised by size:
+    2**32 bytes  one uint8 value per IPv4 address
+    2**29 bytes  one bit per address (responsive or not), MSB first
+"""
+import os
+import numpy as np
+import pygame
+from config import TILE_SIZE, HILBERT_ORDER, TILE_DATA_PATH, DATA_COLOR_LOW, DATA_COLOR_HIGH
+from hilbert import xy2d, d2xy_batch
+from ui import hex_to_rgb
+
+ADDRESS_COUNT = 1 << 32
+CHUNK_ADDRESSES = 1 << 24
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def make_colormap(low=DATA_COLOR_LOW, high=DATA_COLOR_HIGH):
+    lo, hi = np.array(hex_to_rgb(low), dtype=np.float32), np.array(hex_to_rgb(high), dtype=np.float32)
+    t = np.linspace(0.0, 1.0, 256, dtype=np.float32)[:, None]
+    return (lo + (hi - lo) * t).round().astype(np.uint8)
+
+class IPDataset:
+    def __init__(self, path=TILE_DATA_PATH, mode="r"):
+        self.path = path
+        size = os.path.getsize(path)
+        if size == ADDRESS_COUNT:
+            self.kind = "values"
+        elif size == ADDRESS_COUNT // 8:
+            self.kind = "bitset"
+        else:
+            raise ValueError(f"{path}: expected {ADDRESS_COUNT} (values) or {ADDRESS_COUNT // 8} (bitset) bytes, got {size}")
+        self.data = np.memmap(path, dtype=np.uint8, mode=mode)
+
+    @staticmethod
+    def available(path=TILE_DATA_PATH):
+        return bool(path) and os.path.isfile(path) and os.path.getsize(path) in (ADDRESS_COUNT, ADDRESS_COUNT // 8)
+
+    @staticmethod
+    def create(path, kind="bitset"):
+        with open(path, "wb") as f:
+            f.truncate(ADDRESS_COUNT if kind == "values" else ADDRESS_COUNT // 8)
+        return IPDataset(path, mode="r+")
+
+    def block_values(self, start, count, group):
+        """Mean value (0..255) of `count` consecutive groups of `group` addresses from `start`."""
+        out = np.empty(count, dtype=np.float32)
+        per_chunk = max(1, CHUNK_ADDRESSES // group)
+        for i in range(0, count, per_chunk):
+            n = min(per_chunk, count - i)
+            a0 = start + i * group
+            if self.kind == "values":
+                seg = self.data[a0:a0 + n * group]
+                sums = seg.reshape(n, group).sum(axis=1, dtype=np.uint64) if group > 1 else seg
+                out[i:i + n] = sums / group
+            elif group >= 8:
+                seg = _POPCOUNT[self.data[a0 // 8:(a0 + n * group) // 8]]
+                out[i:i + n] = seg.reshape(n, group // 8).sum(axis=1, dtype=np.uint64) * (255.0 / group)
+            else:
+                bits = np.unpackbits(self.data[a0 // 8:(a0 + n * group + 7) // 8])
+                off = a0 % 8
+                out[i:i + n] = bits[off:off + n * group].reshape(n, group).sum(axis=1) * (255.0 / group)
+        return out
+
+def tile_address_range(level, tx, ty):
+    """Level-L tiles are aligned quadtree squares, i.e. one contiguous run on the curve."""
+    span = (TILE_SIZE << level) ** 2
+    return xy2d(1 << HILBERT_ORDER, tx, ty) // span * span, span
+
+def render_tile_values(dataset, level, tx, ty):
+    """(TILE_SIZE, TILE_SIZE) uint8 image of mean values, one pixel per 2**L x 2**L block."""
+    N = 1 << HILBERT_ORDER
+    if not (0 <= tx < N and 0 <= ty < N):
+        return None
+    start, span = tile_address_range(level, tx, ty)
+    group = 4 ** level
+    vals = dataset.block_values(start, span // group, group)
+    xs, ys = d2xy_batch(N, np.arange(start, start + span, group, dtype=np.uint64))
+    img = np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint8)
+    img[(ys - ty) >> level, (xs - tx) >> level] = np.clip(np.rint(vals), 0, 255).astype(np.uint8)
+    return img
+
+def render_tile_rgb(dataset, level, tx, ty, colormap):
+    if (values := render_tile_values(dataset, level, tx, ty)) is None:
+        return None
+    return colormap[values]
+
+class DataTileSource:
+    name = "data"
+
+    def __init__(self, path=TILE_DATA_PATH):
+        self.dataset = IPDataset(path)
+        self.colormap = make_colormap()
+
+    @staticmethod
+    def available(path=TILE_DATA_PATH):
+        return IPDataset.available(path)
+
+    def read(self, level, tx, ty):
+        return None
+
+    def load(self, level, tx, ty):
+        if (rgb := render_tile_rgb(self.dataset, level, tx, ty, self.colormap)) is None:
+            return None
+        return pygame.surfarray.make_surface(rgb.swapaxes(0, 1))
+
+    def keys(self, level):
+        tile_world = TILE_SIZE << level
+        n = max(1, (1 << HILBERT_ORDER) // tile_world)
+        return ((x * tile_world, y * tile_world) for y in range(n) for x in range(n))
@@ -0,0 +1,75 @@
+import csv
+import json
+import time
+from collections import deque
+import profiler
+from config import FRAME_STATS_WINDOW
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))]
+
+class FrameStats:
+    """Per-stage timings of the running view over the last FRAME_STATS_WINDOW frames.
+
+    Call begin() at the start of a frame, lap(stage) after each stage (time since
+    the previous lap is charged to it) and end() once the frame is on screen.
+    """
+    def __init__(self, window=FRAME_STATS_WINDOW):
+        self.frames = deque(maxlen=window)
+        self.stages = []
+        self.frame_count = 0
+        self._frame, self._start, self._last = None, 0.0, 0.0
+
+    def begin(self, start=None) -> None:
+        self._frame, self._last = {}, time.perf_counter() if start is None else start
+        self._start = self._last
+
+    def lap(self, stage: str) -> None:
+        if self._frame is None:
+            return
+        now = time.perf_counter()
+        self._frame[stage] = self._frame.get(stage, 0.0) + (now - self._last) * 1000.0
+        if profiler.active():
+            profiler.record(stage, "frame", self._last, now)
+        self._last = now
+        if stage not in self.stages:
+            self.stages.append(stage)
+
+    def end(self) -> None:
+        if self._frame is None:
+            return
+        now = time.perf_counter()
+        self._frame["total"] = (now - self._start) * 1000.0
+        if profiler.active():
+            profiler.record("frame", "frame", self._start, now)
+        self.frames.append(self._frame)
+        self.frame_count += 1
+        self._frame = None
+
+    def summary(self) -> dict:
+        """{stage: {"avg", "p95", "p99", "max"}} in ms over the window, stages in frame order."""
+        out = {}
+        for stage in self.stages + ["total"]:
+            values = sorted(f.get(stage, 0.0) for f in self.frames)
+            if values:
+                out[stage] = {"avg": sum(values) / len(values), "p95": percentile(values, 95),
+                              "p99": percentile(values, 99), "max": values[-1]}
+        return out
+
+    def dump(self, path: str, extra=None) -> None:
+        """Write the window to `path`: per-frame rows for .csv, summary + frames (+ extra) for .json."""
+        columns = self.stages + ["total"]
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame"] + columns)
+                first = self.frame_count - len(self.frames)
+                for i, frame in enumerate(self.frames):
+                    writer.writerow([first + i] + [f"{frame.get(c, 0.0):.3f}" for c in columns])
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"frames": self.frame_count, "summary": self.summary(),
+                           "window": [{c: round(frame.get(c, 0.0), 3) for c in columns} for frame in self.frames],
+                           **(extra or {})}, f, indent=1)
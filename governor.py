@@ -0,0 +1,62 @@
+from config import (FRAME_BUDGET_MS, GOVERNOR_HEADROOM, GOVERNOR_SMOOTHING, GOVERNOR_DEGRADE_FRAMES,
+                    GOVERNOR_RESTORE_FRAMES, GOVERNOR_LOW_RES_SCALE)
+
+QUALITY_TIERS = ("full", "no bloom", "coarse tiles", "low res", "deferred text")
+
+class QualityGovernor:
+    """Trades rendering quality for frame time, one tier at a time.
+
+    Each drawn frame's cost feeds a smoothed average. Staying over budget for
+    GOVERNOR_DEGRADE_FRAMES drops a tier; staying under GOVERNOR_HEADROOM of the
+    budget for the restore window brings one back. A tier that trips again soon
+    after being restored doubles the restore window, so it doesn't flap.
+    """
+    def __init__(self, budget_ms=FRAME_BUDGET_MS):
+        self.budget_ms = budget_ms
+        self.tier = 0
+        self.avg_ms = None
+        self.frames = self.over = self.under = 0
+        self.restore_frames, self.restored_at = GOVERNOR_RESTORE_FRAMES, None
+
+    def record(self, frame_ms: float) -> bool:
+        """Feed one frame's cost in ms. Returns True if the tier changed."""
+        self.frames += 1
+        self.avg_ms = frame_ms if self.avg_ms is None else self.avg_ms + (frame_ms - self.avg_ms) * GOVERNOR_SMOOTHING
+        if self.avg_ms > self.budget_ms:
+            self.over, self.under = self.over + 1, 0
+        elif self.avg_ms < self.budget_ms * GOVERNOR_HEADROOM:
+            self.over, self.under = 0, self.under + 1
+        else:
+            self.over = self.under = 0
+
+        if self.over >= GOVERNOR_DEGRADE_FRAMES and self.tier < len(QUALITY_TIERS) - 1:
+            bounced = self.restored_at is not None and self.frames - self.restored_at < self.restore_frames
+            self.restore_frames = min(self.restore_frames * 2, GOVERNOR_RESTORE_FRAMES * 16) if bounced else GOVERNOR_RESTORE_FRAMES
+            self.tier += 1
+        elif self.under >= self.restore_frames and self.tier > 0:
+            self.tier -= 1
+            self.restored_at = self.frames
+        else:
+            return False
+        self.over = self.under = 0
+        return True
+
+    @property
+    def bloom(self) -> bool:
+        return self.tier < 1
+
+    @property
+    def level_bias(self) -> int:
+        return 1 if self.tier >= 2 else 0
+
+    @property
+    def render_scale(self) -> int:
+        return GOVERNOR_LOW_RES_SCALE if self.tier >= 3 else 1
+
+    @property
+    def defer_text(self) -> bool:
+        return self.tier >= 4
+
+    @property
+    def label(self) -> str:
+        return QUALITY_TIERS[self.tier]
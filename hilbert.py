@@ -1,22 +1,107 @@
-def _rot(n, x, y, rx, ry):
-    if ry == 0:
-        if rx == 1:
-            x = n - 1 - x
-            y = n - 1 - y
-        x, y = y, x
-    return x, y
+import numpy as np
+
+# The curve is walked as a 4-state machine: the state is the transform
+# (swap x/y, complement both) accumulated from the quadrants above. The tables
+# below advance it one bit (one quadrant) or four bits (one nibble) at a time.
+
+def _step(state, bx, by):
+    swap, flip = state & 1, state >> 1
+    if swap:
+        bx, by = by, bx
+    if flip:
+        bx, by = 1 - bx, 1 - by
+    if by == 0:
+        swap ^= 1
+        flip ^= bx
+    return (3 * bx) ^ by, flip << 1 | swap
+
+def _unstep(state, digit):
+    rx, ry = digit >> 1, (digit ^ (digit >> 1)) & 1
+    bx, by = (1 - rx, 1 - ry) if state >> 1 else (rx, ry)
+    if state & 1:
+        bx, by = by, bx
+    return bx, by, _step(state, bx, by)[1]
+
+def _build_tables(bits):
+    xy2d_t = np.zeros((4, 1 << (2 * bits)), dtype=np.uint16)
+    d2xy_t = np.zeros((4, 1 << (2 * bits)), dtype=np.uint16)
+    for state in range(4):
+        for x in range(1 << bits):
+            for y in range(1 << bits):
+                d, st = 0, state
+                for b in range(bits - 1, -1, -1):
+                    digit, st = _step(st, (x >> b) & 1, (y >> b) & 1)
+                    d = d << 2 | digit
+                xy2d_t[state, x << bits | y] = d | st << 8
+                d2xy_t[state, d] = (x << bits | y) | st << 8
+    return xy2d_t, d2xy_t
+
+XY2D_BIT, D2XY_BIT = _build_tables(1)
+XY2D_NIBBLE, D2XY_NIBBLE = _build_tables(4)
+_XY2D_BIT, _D2XY_BIT = XY2D_BIT.tolist(), D2XY_BIT.tolist()
+_XY2D_NIBBLE, _D2XY_NIBBLE = XY2D_NIBBLE.tolist(), D2XY_NIBBLE.tolist()
+
+def _order(n):
+    return max(0, int(n).bit_length() - 1)
 
 def xy2d(n, x, y):
-    d = 0
-    s = n // 2
-    while s > 0:
-        rx = 1 if (x & s) else 0
-        ry = 1 if (y & s) else 0
-        d += s * s * ((3 * rx) ^ ry)
-        x, y = _rot(s * 2, x, y, rx, ry)
-        s //= 2
+    order = _order(n)
+    d, state = 0, 0
+    for b in range(order - 1, order - 1 - order % 4, -1):
+        e = _XY2D_BIT[state][((x >> b) & 1) << 1 | ((y >> b) & 1)]
+        d, state = d << 2 | (e & 0xFF), e >> 8
+    for b in range(order - order % 4 - 4, -1, -4):
+        e = _XY2D_NIBBLE[state][((x >> b) & 0xF) << 4 | ((y >> b) & 0xF)]
+        d, state = d << 8 | (e & 0xFF), e >> 8
     return d
 
+def d2xy(n, d):
+    order = _order(n)
+    x = y = state = 0
+    for b in range(2 * (order - 1), 2 * (order - 1 - order % 4), -2):
+        e = _D2XY_BIT[state][(d >> b) & 3]
+        x, y, state = x << 1 | ((e >> 1) & 1), y << 1 | (e & 1), e >> 8
+    for b in range(2 * (order - order % 4) - 8, -1, -8):
+        e = _D2XY_NIBBLE[state][(d >> b) & 0xFF]
+        x, y, state = x << 4 | ((e >> 4) & 0xF), y << 4 | (e & 0xF), e >> 8
+    return x, y
+
+def xy2d_batch(n, x, y):
+    """Vectorized xy2d over arrays of coordinates; returns uint64 indices."""
+    order = _order(n)
+    x, y = np.asarray(x, dtype=np.uint64), np.asarray(y, dtype=np.uint64)
+    x, y = np.broadcast_arrays(x, y)
+    d = np.zeros(x.shape, dtype=np.uint64)
+    state = np.zeros(x.shape, dtype=np.intp)
+    for b in range(order - 1, order - 1 - order % 4, -1):
+        e = XY2D_BIT[state, (((x >> b) & 1) << 1 | ((y >> b) & 1)).astype(np.intp)]
+        d = d << 2 | (e & 0xFF)
+        state = (e >> 8).astype(np.intp)
+    for b in range(order - order % 4 - 4, -1, -4):
+        e = XY2D_NIBBLE[state, (((x >> b) & 0xF) << 4 | ((y >> b) & 0xF)).astype(np.intp)]
+        d = d << 8 | (e & 0xFF)
+        state = (e >> 8).astype(np.intp)
+    return d
+
+def d2xy_batch(n, d):
+    """Vectorized d2xy over an array of indices; returns (x, y) uint32 arrays."""
+    order = _order(n)
+    d = np.asarray(d, dtype=np.uint64)
+    x = np.zeros(d.shape, dtype=np.uint32)
+    y = np.zeros(d.shape, dtype=np.uint32)
+    state = np.zeros(d.shape, dtype=np.intp)
+    for b in range(2 * (order - 1), 2 * (order - 1 - order % 4), -2):
+        e = D2XY_BIT[state, ((d >> np.uint64(b)) & np.uint64(3)).astype(np.intp)]
+        x = x << 1 | ((e >> 1) & 1)
+        y = y << 1 | (e & 1)
+        state = (e >> 8).astype(np.intp)
+    for b in range(2 * (order - order % 4) - 8, -1, -8):
+        e = D2XY_NIBBLE[state, ((d >> np.uint64(b)) & np.uint64(0xFF)).astype(np.intp)]
+        x = x << 4 | ((e >> 4) & 0xF)
+        y = y << 4 | (e & 0xF)
+        state = (e >> 8).astype(np.intp)
+    return x, y
+
 def int_to_ipv4(i):
     i &= 0xFFFFFFFF
     return f"{(i>>24)&0xFF}.{(i>>16)&0xFF}.{(i>>8)&0xFF}.{i&0xFF}"
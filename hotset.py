@@ -0,0 +1,38 @@
+import json
+import os
+from collections import defaultdict
+from cache import tile_access_counts, warm_tiles
+from config import MAX_LEVEL, HILBERT_ORDER, HOTSET_PATH, HOTSET_PER_LEVEL
+from tiles import visible_tile_keys, level_for_zoom
+
+def save_hot_set(path=HOTSET_PATH, per_level=HOTSET_PER_LEVEL):
+    """Persist the most frequently drawn tiles of this session, per level."""
+    by_level = defaultdict(list)
+    for (level, tx, ty), count in tile_access_counts().most_common():
+        if len(by_level[level]) < per_level:
+            by_level[level].append([tx, ty])
+    if not by_level:
+        return
+    try:
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"levels": {str(level): keys for level, keys in sorted(by_level.items())}}, f)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass
+
+def load_hot_set(path=HOTSET_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            levels = json.load(f)["levels"]
+        return [(int(level), tx, ty) for level, keys in levels.items() for tx, ty in keys]
+    except (OSError, ValueError, KeyError, TypeError):
+        return []
+
+def warm_up(cam, screen_w, screen_h, path=HOTSET_PATH):
+    """Preload the opening view, the two coarsest levels and last session's hot set."""
+    keys = visible_tile_keys(cam.x, cam.y, cam.zoom, screen_w, screen_h, level_for_zoom(cam.zoom))
+    N = 1 << HILBERT_ORDER
+    for level in (MAX_LEVEL, MAX_LEVEL - 1):
+        keys += visible_tile_keys(0, 0, 1, N, N, level)
+    keys += load_hot_set(path)
+    warm_tiles(list(dict.fromkeys(keys)))
@@ -0,0 +1,94 @@
+"""Fold new scan results into the per-IP store and re-render only what changed.
+
+    python ingest.py scan-2024-05-01.txt.gz masscan.lst --out .
+
+Input files are streamed (plain or gzip); any line containing an IPv4 address
+counts, which covers zmap output and masscan's list/grepable/JSON formats.
+Only level-0 tiles holding an address whose value actually changed are rebuilt,
+together with their ancestors. The rebuilt keys are appended to
+TILE_INVALIDATION_LOG in the --out directory, which a viewer running from
+there polls to drop just those tiles.
+
+Addresses accumulate in INGEST_STORE_PATH, which the viewer ignores, so it
+keeps serving the rebuilt pyramid; pass --store survey.bin (TILE_DATA_PATH)
+to have the viewer render the store directly instead. A TILE_PACK_PATH
+archive already in --out is rewritten so a viewer serving it sees the change.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+from config import TILE_SIZE, TILE_PACK_PATH, TILE_INVALIDATION_LOG, TILE_MANIFEST_PATH, INGEST_STORE_PATH
+from build_pyramid import read_address_batches, build_pyramid
+from datasource import IPDataset
+from hilbert import d2xy
+from manifest import TileManifest
+from tile_sources import DirectoryTileSource
+from tilepack import PackTileSource, write_pack
+
+LEVEL0_TILES = 1 << 16
+
+def ingest_files(paths, dataset, value=255):
+    """Mark every address found in `paths`. Returns (addresses seen, touched level-0 tile keys)."""
+    touched = np.zeros(LEVEL0_TILES, dtype=bool)
+    seen = 0
+    for path in paths:
+        for addrs in read_address_batches(path):
+            if dataset.kind == "bitset":
+                idx, mask = addrs >> 3, (0x80 >> (addrs & 7)).astype(np.uint8)
+                changed = (dataset.data[idx] & mask) == 0
+                np.bitwise_or.at(dataset.data, idx, mask)
+            else:
+                changed = dataset.data[addrs] != value
+                dataset.data[addrs] = value
+            # Level-0 tiles are 2**16 consecutive addresses on the curve.
+            touched[addrs[changed] >> 16] = True
+            seen += len(addrs)
+    dataset.data.flush()
+    return seen, [(x * TILE_SIZE, y * TILE_SIZE) for x, y in (d2xy(256, int(t)) for t in np.flatnonzero(touched))]
+
+def append_invalidations(touched, path=TILE_INVALIDATION_LOG):
+    tiles = [[level, tx, ty] for level, keys in touched.items() for tx, ty in keys]
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"time": time.time(), "tiles": tiles}) + "\n")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest scan results and rebuild only the affected tiles.")
+    parser.add_argument("scans", nargs="+", help="scan output files (plain or gzip)")
+    parser.add_argument("--store", help=f"per-IP store to update, created as a bitset if missing (default: {INGEST_STORE_PATH} in --out)")
+    parser.add_argument("--value", type=int, default=255, help="value written for responsive addresses in a uint8 store")
+    parser.add_argument("--out", default=".", help="directory holding level0..level8")
+    parser.add_argument("--pack", help=f"rewrite this packed archive afterwards (default: {TILE_PACK_PATH} in --out, if present)")
+    parser.add_argument("--manifest", help=f"manifest to update, if it exists (default: {TILE_MANIFEST_PATH} in --out)")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+    args.store = args.store or os.path.join(args.out, INGEST_STORE_PATH)
+    args.manifest = args.manifest or os.path.join(args.out, TILE_MANIFEST_PATH)
+    if args.pack is None and PackTileSource.available(pack := os.path.join(args.out, TILE_PACK_PATH)):
+        args.pack = pack
+
+    for path in args.scans:
+        if not os.path.isfile(path):
+            sys.exit(f"{path} not found")
+    dataset = IPDataset(args.store, mode="r+") if IPDataset.available(args.store) else IPDataset.create(args.store)
+    t0 = time.perf_counter()
+    seen, keys = ingest_files(args.scans, dataset, args.value)
+    print(f"{seen} addresses read, {len(keys)} level-0 tiles changed ({time.perf_counter() - t0:.1f}s)")
+    if not keys:
+        return
+
+    touched = build_pyramid(args.store, args.out, keys=keys, jobs=args.jobs, force=True)
+    if args.pack:
+        write_pack(DirectoryTileSource(args.out), args.pack)
+        print(f"Wrote {args.pack}")
+    if TileManifest.available(args.manifest):
+        manifest = TileManifest.load(args.manifest)
+        manifest.scan(PackTileSource(args.pack) if args.pack else DirectoryTileSource(args.out), touched)
+        manifest.save(args.manifest)
+    append_invalidations(touched, os.path.join(args.out, TILE_INVALIDATION_LOG))
+    print(f"Done in {time.perf_counter() - t0:.1f}s")
+
+if __name__ == "__main__":
+    main()
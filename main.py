@@ -1,16 +1,26 @@
-import math
+import argparse
 import os
+import time
 import webbrowser
 import pygame
 from config  import *
 from hilbert import xy2d, int_to_ipv4
-from cache   import clear_tile_caches
+from cache   import clear_tile_caches, pump_tile_loads, stop_tile_workers, poll_tile_invalidations, inflight_count, tile_cache_stats
 from camera  import Camera
-from tiles   import draw_visible_tiles, draw_subnet_border
+from tiles   import draw_subnet_border, level_for_zoom
+from compositor import TileCompositor
+from prefetch import Prefetcher
+from hotset  import warm_up, save_hot_set
+from bloom   import Bloom
+from governor import QualityGovernor
+from framestats import FrameStats
 from panels  import register_panels_for_mouse, schedule_rdap_lookups, render_panels
-from ui      import create_font, render_ip_octets, hud_render
+from ui      import create_font, render_ip_octets, hud_render, render_stats_panel
 from context import ContextMenu
+from rdap    import rdap_results_version, rdap_busy, rdap_pending, rdap_cache, rdap_index
 from startup import startup_procedure
+from replay  import EventRecorder
+import profiler
 
 STATE_TITLE, STATE_RUNNING, STATE_SETTINGS, STATE_VIEW_CONFIG, STATE_HELP, STATE_CREDITS = "title", "running", "settings", "view_config", "help", "credits"
 GITHUB_URL = "https://github.com/gallium-gonzollium/ViewTheInternet"
@@ -26,21 +36,7 @@ def dim_background(screen, alpha=128):
     overlay.fill((0,0,0,alpha))
     screen.blit(overlay, (0,0))
 
-def apply_bloom(screen, strength: float, radius: int):
-    try:
-        sw, sh = screen.get_size()
-        factor = max(1, int(radius))
-        small = pygame.transform.smoothscale(screen, (sw//factor, sh//factor))
-        bloom = pygame.transform.smoothscale(small, (sw, sh))
-        brightness = max(0.0, min(1.0, strength))
-        dimmer = pygame.Surface((sw, sh)).convert_alpha()
-        dimmer.fill((int(255 * brightness),) * 3 + (255,))
-        bloom.blit(dimmer, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
-        screen.blit(bloom, (0, 0), special_flags=pygame.BLEND_RGBA_ADD)
-    except:
-        pass
-
-def main():
+def main(record=None, profile=False):
     startup_procedure()
     pygame.init()
     info = pygame.display.Info()
@@ -53,20 +49,55 @@ def main():
     title_font, menu_font, small_font = create_font(64), create_font(36), create_font(20)
 
     cam = Camera(SCREEN_W, SCREEN_H)
+    compositor = TileCompositor(SCREEN_W, SCREEN_H)
+    prefetcher = Prefetcher(SCREEN_W, SCREEN_H)
+    bloom = Bloom(SCREEN_W, SCREEN_H) if BLOOM_ENABLED else None
+    governor = QualityGovernor()
+    frame_stats, show_stats, stats_cache = FrameStats(), False, {}
+    recorder = EventRecorder(record, (SCREEN_W, SCREEN_H)) if record else None
+    if profile:
+        profiler.start()
+    warm_up(cam, SCREEN_W, SCREEN_H)
     context_menu = ContextMenu()
-    state, last_lookup_time = STATE_TITLE, 0.0
+    state, last_lookup_time, last_invalidation_poll = STATE_TITLE, 0.0, 0.0
     octet_cache, panel_text_cache, hud_cache = {}, {}, {}
     config_text = open(os.path.join(os.path.dirname(__file__), "config.py"), "r", encoding="utf-8").read()
     config_lines, config_scroll = config_text.splitlines(), 0
 
-    running = True
+    running, linger_until = True, 0.0
+    seen_versions = None
     while running:
-        dt = clock.tick(60) / 1000.0
+        # Redraw while something is changing; once idle, sleep on the event queue
+        # (briefly if decodes, lookups or pings are still out, so their results show promptly).
+        if time.time() < linger_until:
+            clock.tick(FRAME_RATE)
+            events = pygame.event.get()
+        else:
+            busy = inflight_count() or rdap_busy() or context_menu.active_pings
+            ev = pygame.event.wait(1000 // FRAME_RATE if busy else IDLE_WAIT_MS)
+            events = ([] if ev.type == pygame.NOEVENT else [ev]) + pygame.event.get()
+            clock.tick()
+        frame_start = time.perf_counter()
         click_pos, click_button = None, None
 
+        arrived = pump_tile_loads()
+        dirty = bool(events or arrived)
+        if time.time() - last_invalidation_poll > TILE_INVALIDATION_POLL:
+            last_invalidation_poll = time.time()
+            if poll_tile_invalidations():
+                compositor.invalidate()
+                dirty = True
+        if (versions := (rdap_results_version(), context_menu.results_version)) != seen_versions:
+            seen_versions, dirty = versions, True
+        if dirty:
+            linger_until = time.time() + IDLE_LINGER
+        elif time.time() >= linger_until:
+            continue
         context_menu.update()
+        if recorder and state == STATE_RUNNING:
+            recorder.record(cam, pygame.mouse.get_pos(), events)
 
-        for ev in pygame.event.get():
+        for ev in events:
             if ev.type == pygame.QUIT: 
                 running = False
                 
@@ -92,6 +123,12 @@ def main():
                     else:
                         context_menu.hide()
             
+            if ev.type == pygame.KEYDOWN and ev.key == pygame.key.key_code(FRAME_STATS_KEY):
+                show_stats = not show_stats
+            if ev.type == pygame.KEYDOWN and ev.key == pygame.key.key_code(PROFILE_KEY):
+                if written := profiler.toggle():
+                    print("Profile written to " + " and ".join(written))
+
             if ev.type == pygame.KEYDOWN and ev.key == pygame.K_ESCAPE:
                 if state in (STATE_SETTINGS, STATE_VIEW_CONFIG, STATE_HELP, STATE_CREDITS):
                     state = STATE_RUNNING
@@ -105,8 +142,8 @@ def main():
             elif state == STATE_VIEW_CONFIG and ev.type == pygame.MOUSEWHEEL:
                 config_scroll = max(0, config_scroll - ev.y * 4)
 
-        screen.fill((0,0,0))
         if state != STATE_RUNNING: 
+            screen.fill((0,0,0))
             dim_background(screen, 128)
 
         if state == STATE_TITLE:
@@ -209,9 +246,14 @@ def main():
                     state = STATE_RUNNING
 
         elif state == STATE_RUNNING:
+            frame_stats.begin(frame_start)
+            frame_stats.lap("events")
             cam.zoom = max(cam.zoom, MIN_ZOOM)
-            level = max(0, min(MAX_LEVEL, int(round(-math.log2(cam.zoom)))))
-            draw_visible_tiles(screen, cam.x, cam.y, cam.zoom, SCREEN_W, SCREEN_H, level)
+            level = min(MAX_LEVEL, level_for_zoom(cam.zoom) + governor.level_bias)
+            compositor.set_scale(governor.render_scale)
+            compositor.update(cam.x, cam.y, cam.zoom, level, arrived)
+            prefetcher.update(cam, level)
+            frame_stats.lap("tiles")
 
             mx, my = pygame.mouse.get_pos()
             mouse_wx, mouse_wy = cam.x + mx / cam.zoom, cam.y + my / cam.zoom
@@ -220,44 +262,68 @@ def main():
             d = xy2d(N, hx, hy)
             ip_str = int_to_ipv4(d)
 
-            for bs in (BLOCK_SIZE_32, BLOCK_SIZE_24, BLOCK_SIZE_16, BLOCK_SIZE_8):
-                bx, by = (hx // bs) * bs, (hy // bs) * bs
-                draw_subnet_border(screen, cam.x, cam.y, cam.zoom, SCREEN_W, SCREEN_H, bx, by, bs)
-
             panels = register_panels_for_mouse(hx, hy, cam.x, cam.y, cam.zoom, SCREEN_W, SCREEN_H, d, ip_str)
             last_lookup_time = schedule_rdap_lookups(ip_str, panels, last_lookup_time, LOOKUP_DEBOUNCE)
+            frame_stats.lap("hover")
 
-            current_panels = panels
-            current_ip_int = d
-            current_ip_str = ip_str
+            layer = compositor.output()
+            screen.blit(layer, (0, 0))
+            frame_stats.lap("blit")
+            if bloom and governor.bloom:
+                bloom.update(layer, compositor.version)
+                bloom.apply(screen)
+            frame_stats.lap("bloom")
 
-            if BLOOM_ENABLED:
-                tile_layer = pygame.Surface((SCREEN_W, SCREEN_H))
-                tile_layer.blit(screen, (0, 0))
-                
-                apply_bloom(tile_layer, BLOOM_STRENGTH, BLOOM_RADIUS)
-                
-                screen.fill((0, 0, 0))
-                screen.blit(tile_layer, (0, 0))
-                
-                octet_cache = render_ip_octets(screen, current_ip_str, SCREEN_H, ip_font, octet_cache)
-                render_panels(screen, current_panels, cam.x, cam.y, cam.zoom, SCREEN_W, SCREEN_H, panel_text_cache, current_ip_int, current_ip_str)
-                hud_render(screen, hud_font, clock, hud_cache, cam.zoom, level)
-            else:
-                octet_cache = render_ip_octets(screen, current_ip_str, SCREEN_H, ip_font, octet_cache)
-                render_panels(screen, current_panels, cam.x, cam.y, cam.zoom, SCREEN_W, SCREEN_H, panel_text_cache, current_ip_int, current_ip_str)
-                hud_render(screen, hud_font, clock, hud_cache, cam.zoom, level)
+            for bs in (BLOCK_SIZE_32, BLOCK_SIZE_24, BLOCK_SIZE_16, BLOCK_SIZE_8):
+                bx, by = (hx // bs) * bs, (hy // bs) * bs
+                draw_subnet_border(screen, cam.x, cam.y, cam.zoom, SCREEN_W, SCREEN_H, bx, by, bs)
+            frame_stats.lap("borders")
+
+            octet_cache = render_ip_octets(screen, ip_str, SCREEN_H, ip_font, octet_cache)
+            if render_panels(screen, panels, cam.x, cam.y, cam.zoom, SCREEN_W, SCREEN_H, panel_text_cache, d, ip_str, governor.defer_text):
+                linger_until = time.time() + IDLE_LINGER
+            frame_stats.lap("panels")
+            hud_render(screen, hud_font, clock, hud_cache, cam.zoom, level, governor.label)
+            if show_stats:
+                tiles = tile_cache_stats()
+                render_stats_panel(screen, hud_font, frame_stats, {
+                    "tile hits": f"{tiles['raw']['hit_rate']:.1%} raw, {tiles['scaled']['hit_rate']:.1%} scaled",
+                    "tile cache": f"{tiles['bytes'] / 2**20:.0f} / {tiles['budget'] / 2**20:.0f} MiB",
+                    "decodes in flight": inflight_count(),
+                    "rdap": f"{rdap_pending()} pending, {len(rdap_cache.od)} cached, {len(rdap_index.by_key)} ranges",
+                }, stats_cache)
+            frame_stats.lap("hud")
 
             context_menu.draw(screen)
+            frame_stats.lap("menu")
 
         pygame.display.flip()
+        if state == STATE_RUNNING:
+            frame_stats.lap("flip")
+            frame_stats.end()
+            governor.record((time.perf_counter() - frame_start) * 1000.0)
 
     try:
         from rdap import rdap_q, RDAP_WORKER_SHUTDOWN
         rdap_q.put_nowait(RDAP_WORKER_SHUTDOWN)
     except: 
         pass
+    save_hot_set()
+    if recorder:
+        recorder.save()
+    if profiler.active() and (written := profiler.stop()):
+        print("Profile written to " + " and ".join(written))
+    if FRAME_STATS_PATH and frame_stats.frame_count:
+        try:
+            frame_stats.dump(FRAME_STATS_PATH, {"caches": tile_cache_stats()})
+        except OSError:
+            pass
+    stop_tile_workers()
     clear_tile_caches()
     pygame.quit()
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="View the Internet")
+    parser.add_argument("--record", metavar="PATH", help="record the session's input for benchmark.py --replay")
+    parser.add_argument("--profile", action="store_true", help=f"capture a profile from launch until exit or {PROFILE_KEY.upper()}")
+    main(**vars(parser.parse_args()))
@@ -0,0 +1,145 @@
+"""Per-pyramid manifest: for every (level, tx, ty) whether the tile exists, whether
+it is one solid colour (and which), and a hash of its encoded bytes.
+
+    python manifest.py build      # scan the current tile source and write TILE_MANIFEST_PATH
+    python manifest.py verify     # re-hash every tile against the manifest
+
+The viewer uses it to skip absent tiles without touching the disk and to paint
+solid tiles with Surface.fill instead of decoding them.
+"""
+import argparse
+import hashlib
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pygame
+from config import TILE_SIZE, MAX_LEVEL, HILBERT_ORDER, TILE_MANIFEST_PATH
+from tile_sources import decode_tile
+
+MANIFEST_MAGIC, MANIFEST_VERSION = b"VTMANIF\0", 1
+FLAG_EXISTS, FLAG_SOLID = 1, 2
+RECORD = np.dtype([("flags", "u1"), ("rgb", "u1", (3,)), ("digest", "<u8")])
+
+def grid(level):
+    tile_world = TILE_SIZE << level
+    return tile_world, max(1, (1 << HILBERT_ORDER) // tile_world)
+
+def describe_tile(data):
+    """(flags, rgb, digest) for one encoded tile."""
+    if data is None or (surf := decode_tile(data)) is None:
+        return 0, (0, 0, 0), 0
+    digest = int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+    px = pygame.surfarray.array3d(surf)
+    first = px[0, 0]
+    if (px == first).all():
+        return FLAG_EXISTS | FLAG_SOLID, tuple(int(c) for c in first), digest
+    return FLAG_EXISTS, (0, 0, 0), digest
+
+class TileManifest:
+    def __init__(self, levels=None):
+        self.levels = levels or [np.zeros(grid(level)[1] ** 2, dtype=RECORD) for level in range(MAX_LEVEL + 1)]
+
+    @staticmethod
+    def available(path=TILE_MANIFEST_PATH):
+        return os.path.isfile(path)
+
+    @classmethod
+    def load(cls, path=TILE_MANIFEST_PATH):
+        with open(path, "rb") as f:
+            if f.read(8) != MANIFEST_MAGIC or int.from_bytes(f.read(2), "little") != MANIFEST_VERSION:
+                raise ValueError(f"{path} is not a v{MANIFEST_VERSION} tile manifest")
+            count = int.from_bytes(f.read(2), "little")
+            levels = [np.fromfile(f, dtype=RECORD, count=grid(level)[1] ** 2) for level in range(count)]
+        manifest = cls(levels)
+        manifest.path, manifest.mtime = path, os.path.getmtime(path)
+        return manifest
+
+    def save(self, path=TILE_MANIFEST_PATH):
+        with open(path + ".tmp", "wb") as f:
+            f.write(MANIFEST_MAGIC + MANIFEST_VERSION.to_bytes(2, "little") + len(self.levels).to_bytes(2, "little"))
+            for records in self.levels:
+                records.tofile(f)
+        os.replace(path + ".tmp", path)
+
+    def record(self, level, tx, ty):
+        if not 0 <= level < len(self.levels):
+            return None
+        tile_world, n = grid(level)
+        i, j = tx // tile_world, ty // tile_world
+        if not (0 <= i < n and 0 <= j < n):
+            return None
+        return self.levels[level][j * n + i]
+
+    def exists(self, level, tx, ty):
+        rec = self.record(level, tx, ty)
+        return rec is not None and bool(rec["flags"] & FLAG_EXISTS)
+
+    def solid_color(self, level, tx, ty):
+        rec = self.record(level, tx, ty)
+        if rec is None or not rec["flags"] & FLAG_SOLID:
+            return None
+        return tuple(int(c) for c in rec["rgb"])
+
+    def keys(self, level):
+        tile_world, n = grid(level)
+        idx = np.flatnonzero(self.levels[level]["flags"] & FLAG_EXISTS)
+        return {(int(i % n) * tile_world, int(i // n) * tile_world) for i in idx}
+
+    def scan(self, source, keys_by_level, workers=8, progress=None):
+        """(Re)describe the given tiles of `source`, e.g. after ingest.py rebuilt them."""
+        with ThreadPoolExecutor(workers) as pool:
+            for level, keys in keys_by_level.items():
+                keys = list(keys)
+                tile_world, n = grid(level)
+                for (tx, ty), (flags, rgb, digest) in zip(keys, pool.map(lambda k: describe_tile(source.read(level, *k)), keys)):
+                    rec = self.levels[level][ty // tile_world * n + tx // tile_world]
+                    rec["flags"], rec["rgb"], rec["digest"] = flags, rgb, digest
+                if progress:
+                    progress(level, keys)
+
+    @classmethod
+    def build(cls, source, workers=8, progress=None):
+        manifest = cls()
+        manifest.scan(source, {level: source.keys(level) for level in range(MAX_LEVEL + 1)}, workers, progress)
+        return manifest
+
+    def verify(self, source, deep=False):
+        """List of problems found comparing `source` against the manifest; empty when consistent."""
+        problems = []
+        for level in range(len(self.levels)):
+            expected, actual = self.keys(level), set(source.keys(level))
+            if missing := expected - actual:
+                problems.append(f"level{level}: {len(missing)} tiles missing, e.g. {sorted(missing)[0]}")
+            if extra := actual - expected:
+                problems.append(f"level{level}: {len(extra)} tiles not in manifest, e.g. {sorted(extra)[0]}")
+            if deep:
+                tile_world, n = grid(level)
+                for tx, ty in sorted(expected & actual):
+                    data = source.read(level, tx, ty)
+                    digest = int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little") if data is not None else None
+                    if digest != int(self.levels[level][ty // tile_world * n + tx // tile_world]["digest"]):
+                        problems.append(f"level{level}: tile_{tx}_{ty} does not match its checksum")
+        return problems
+
+def main(argv=None):
+    from startup import select_tile_source
+
+    parser = argparse.ArgumentParser(description="Build or verify the tile manifest.")
+    parser.add_argument("command", choices=("build", "verify"))
+    parser.add_argument("--path", default=TILE_MANIFEST_PATH)
+    args = parser.parse_args(argv)
+
+    source = select_tile_source()
+    if args.command == "build":
+        manifest = TileManifest.build(source, progress=lambda level, keys: print(f"level{level}: {len(keys)} tiles"))
+        manifest.save(args.path)
+        solid = sum(int((r["flags"] & FLAG_SOLID).astype(bool).sum()) for r in manifest.levels)
+        print(f"Wrote {args.path} ({solid} solid tiles)")
+    else:
+        problems = TileManifest.load(args.path).verify(source, deep=True)
+        print("\n".join(problems) or "Pyramid matches the manifest")
+        sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
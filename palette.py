@@ -0,0 +1,46 @@
+import threading
+import numpy as np
+import pygame
+
+class SharedPalette:
+    """One append-only 256-entry palette shared by every cached base tile.
+
+    Tiles are remapped to 8-bit surfaces indexing into it; a tile that would
+    need more colours than the palette has room for stays in its original format.
+    Indices never change once assigned, so older surfaces stay valid as it grows.
+    """
+    def __init__(self):
+        self.colors = []
+        self.index = {}
+        self.lock = threading.Lock()
+
+    def _indices_for(self, packed_colors):
+        with self.lock:
+            out = []
+            for c in packed_colors.tolist():
+                if (i := self.index.get(c)) is None:
+                    if len(self.colors) >= 256:
+                        return None
+                    i = self.index[c] = len(self.colors)
+                    self.colors.append(((c >> 16) & 0xFF, (c >> 8) & 0xFF, c & 0xFF))
+                out.append(i)
+            return np.array(out, dtype=np.uint8), self.colors + [(0, 0, 0)] * (256 - len(self.colors))
+
+    def to_paletted(self, surf):
+        """8-bit copy of surf on the shared palette, or None if it does not fit."""
+        if surf.get_bitsize() == 8:
+            src = np.array([(r << 16) | (g << 8) | b for r, g, b, *_ in surf.get_palette()], dtype=np.uint32)
+            used, inv = np.unique(pygame.surfarray.array2d(surf), return_inverse=True)
+            colors = src[used]
+        else:
+            rgb = pygame.surfarray.array3d(surf).astype(np.uint32)
+            colors, inv = np.unique(rgb[..., 0] << 16 | rgb[..., 1] << 8 | rgb[..., 2], return_inverse=True)
+            if len(colors) > 256:
+                return None
+        if (mapped := self._indices_for(colors)) is None:
+            return None
+        lut, palette = mapped
+        out = pygame.Surface(surf.get_size(), depth=8)
+        out.set_palette(palette)
+        pygame.surfarray.blit_array(out, lut[inv].reshape(surf.get_size()))
+        return out
@@ -2,11 +2,10 @@ import math
 import time
 import pygame
 from config import *
-from rdap import rdap_cache, enqueue_rdap_query, choose_best_rdap, rdap_summary_from_json
-from ui import render_text_with_border, hex_to_rgb, create_font
+from rdap import rdap_resolve, enqueue_rdap_query, cancel_rdap_queries, choose_best_rdap, rdap_summary_from_json
+from ui import render_text_with_border, hex_to_rgb, create_font, INFO_BG_RGBA
 from hilbert import int_to_ipv4
 
-INFO_BG_RGBA = (*hex_to_rgb(COLOR_INFO_BG), 220) if isinstance(COLOR_INFO_BG, str) else (*COLOR_INFO_BG, 220)
 
 def prefix_len_from_block(bs: int) -> int:
     return 32 - int(round(math.log2(bs * bs)))
@@ -60,21 +59,21 @@ def schedule_rdap_lookups(ip_str: str, panels: dict, last_time: float, debounce:
     if now - last_time <= debounce:
         return last_time
 
-    ip_key = f"ip:{ip_str}"
-    if not rdap_cache.contains(ip_key):
-        enqueue_rdap_query(ip_key, ip_str)
+    wanted = {f"ip:{ip_str}": ip_str, **{f"net:{prefix}": prefix for prefix in panels}}
+    if missing := [key for key in wanted if not rdap_resolve(key)[0]]:
+        # Lookups for where the cursor used to be are no longer worth waiting on.
+        cancel_rdap_queries(wanted)
+        for key in missing:
+            enqueue_rdap_query(key, wanted[key])
         last_time = now
 
-    for prefix in panels:
-        net_key = f"net:{prefix}"
-        if not rdap_cache.contains(net_key):
-            enqueue_rdap_query(net_key, prefix)
-            last_time = now
-
     return last_time
 
 def render_panels(screen: pygame.Surface, panels: dict, cam_x: float, cam_y: float, zoom: float,
-                  screen_w: int, screen_h: int, text_cache: dict, ip_int: int, ip_str: str):
+                  screen_w: int, screen_h: int, text_cache: dict, ip_int: int, ip_str: str, defer_text=False) -> bool:
+    """Draw the RDAP panels. With defer_text, panels whose text changed keep showing
+    their last rendered text; returns True if any were left stale that way."""
+    deferred = False
     for prefix, info in panels.items():
         outer, anchor, block_size = info["outer"], info["anchor"], info["block_size"]
         if not MIN_RENDER_PIXELS <= outer.width <= MAX_RENDER_PIXELS:
@@ -83,8 +82,8 @@ def render_panels(screen: pygame.Surface, panels: dict, cam_x: float, cam_y: flo
         font_size = max(MIN_FONT_SIZE, int(outer.width * FONT_SCALE_MULTIPLIER))
         font = create_font(font_size)
 
-        net_data = rdap_cache.get(f"net:{prefix}") if rdap_cache.contains(f"net:{prefix}") else None
-        ip_data = rdap_cache.get(f"ip:{ip_str}") if rdap_cache.contains(f"ip:{ip_str}") else None
+        net_found, net_data = rdap_resolve(f"net:{prefix}")
+        ip_found, ip_data = rdap_resolve(f"ip:{ip_str}")
         best_data = choose_best_rdap(net_data, ip_data)
         summary = rdap_summary_from_json(best_data) if best_data else None
 
@@ -95,11 +94,17 @@ def render_panels(screen: pygame.Surface, panels: dict, cam_x: float, cam_y: flo
             if summary.get("abuse"): lines.append(f"Abuse: {summary['abuse']}")
             if summary.get("handle") and not summary.get("org"): lines.append(f"Handle: {summary['handle']}")
         else:
-            lines.append("(no data)" if rdap_cache.contains(f"net:{prefix}") or rdap_cache.contains(f"ip:{ip_str}") else "fetching...")
+            lines.append("(no data)" if net_found or ip_found else "fetching...")
 
         cache_key = (prefix, font_size, tuple(lines))
         if cache_key not in text_cache:
-            text_cache[cache_key] = [render_text_with_border(font, line, hex_to_rgb(COLOR_INFO_TEXT), border=1) for line in lines]
+            if defer_text:
+                deferred = True
+                if (cache_key := text_cache.get(("last", prefix))) is None:
+                    continue
+            else:
+                text_cache[cache_key] = [render_text_with_border(font, line, hex_to_rgb(COLOR_INFO_TEXT), border=1) for line in lines]
+        text_cache[("last", prefix)] = cache_key
 
         text_surfaces = text_cache[cache_key]
         pad = max(6, PANEL_PADDING * font_size // 12)
@@ -119,4 +124,6 @@ def render_panels(screen: pygame.Surface, panels: dict, cam_x: float, cam_y: flo
         y = panel_rect.top + pad
         for ts in text_surfaces:
             screen.blit(ts, (panel_rect.left + pad, y))
-            y += ts.get_height()
\ No newline at end of file
+            y += ts.get_height()
+
+    return deferred
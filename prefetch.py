@@ -0,0 +1,42 @@
+import time
+from cache import prefetch_tiles
+from config import MAX_LEVEL, MIN_ZOOM, MAX_ZOOM, ZOOM_FACTOR, PREFETCH_WINDOW, PREFETCH_HORIZON
+from tiles import visible_tile_keys, level_for_zoom
+
+class Prefetcher:
+    """Predicts the view a few hundred ms ahead from the camera's recent input
+    and queues the tiles it will need at prefetch priority."""
+    def __init__(self, screen_w: int, screen_h: int):
+        self.screen_w, self.screen_h = screen_w, screen_h
+
+    def pan_velocity(self, cam, now):
+        samples = [s for s in cam.history if now - s[0] <= PREFETCH_WINDOW]
+        if len(samples) < 2 or (dt := samples[-1][0] - samples[0][0]) <= 1e-3:
+            return 0.0, 0.0
+        return (samples[-1][1] - samples[0][1]) / dt, (samples[-1][2] - samples[0][2]) / dt
+
+    def predicted_keys(self, cam, level, now=None):
+        now = time.time() if now is None else now
+        w, h = self.screen_w, self.screen_h
+        current = set(visible_tile_keys(cam.x, cam.y, cam.zoom, w, h, level))
+        keys = []
+
+        vx, vy = self.pan_velocity(cam, now)
+        if vx or vy:
+            # Never look further ahead than one screen.
+            dx = max(-w / cam.zoom, min(w / cam.zoom, vx * PREFETCH_HORIZON))
+            dy = max(-h / cam.zoom, min(h / cam.zoom, vy * PREFETCH_HORIZON))
+            keys += [k for k in visible_tile_keys(cam.x + dx, cam.y + dy, cam.zoom, w, h, level) if k not in current]
+
+        if cam.zoom_dir and now - cam.zoom_time <= PREFETCH_WINDOW * 2:
+            # Next wheel step around the same anchor: finer level on zoom-in, parent level on zoom-out.
+            zoom = max(MIN_ZOOM, min(MAX_ZOOM, cam.zoom * ZOOM_FACTOR ** cam.zoom_dir))
+            next_level = level_for_zoom(zoom)
+            if next_level != level and 0 <= next_level <= MAX_LEVEL:
+                mx, my = cam.zoom_anchor
+                x, y = cam.x + mx / cam.zoom - mx / zoom, cam.y + my / cam.zoom - my / zoom
+                keys += visible_tile_keys(x, y, zoom, w, h, next_level)
+        return keys
+
+    def update(self, cam, level):
+        prefetch_tiles(self.predicted_keys(cam, level))
@@ -0,0 +1,132 @@
+"""Runtime profiling capture.
+
+While a capture is running, span() records timed spans from any thread and
+a sampler thread walks every thread's stack each PROFILE_SAMPLE_INTERVAL.
+stop() writes a Chrome trace (open in chrome://tracing or ui.perfetto.dev)
+and a flat top-N report next to it. When no capture is running span() hands
+back a shared no-op context manager, so instrumented code pays one call.
+"""
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from config import PROFILE_PATH, PROFILE_SAMPLE_INTERVAL, PROFILE_TOP_N, PROFILE_MAX_EVENTS
+
+_active = False
+_spans = []
+_thread_names = {}
+_self_samples, _inclusive_samples = Counter(), Counter()
+_sample_count = 0
+_sampler = None
+_started = 0.0
+_NULL = contextlib.nullcontext()
+
+def active() -> bool:
+    return _active
+
+def record(name, cat, start, end, arg=None):
+    """Add a finished span; start/end are time.perf_counter() values."""
+    if not _active or len(_spans) >= PROFILE_MAX_EVENTS:
+        return
+    tid = threading.get_ident()
+    if tid not in _thread_names:
+        _thread_names[tid] = threading.current_thread().name
+    _spans.append((name, cat, start, end, tid, arg))
+
+class _Span:
+    __slots__ = ("name", "cat", "arg", "start")
+    def __init__(self, name, cat, arg):
+        self.name, self.cat, self.arg = name, cat, arg
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.cat, self.start, time.perf_counter(), self.arg)
+        return False
+
+def span(name, cat="main", arg=None):
+    return _Span(name, cat, arg) if _active else _NULL
+
+def _frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+def _sample_loop(interval):
+    global _sample_count
+    me = threading.get_ident()
+    while _active:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for tid, frame in sys._current_frames().items():
+            if tid == me:
+                continue
+            labels, depth = [], 0
+            while frame is not None and depth < 64:
+                labels.append(_frame_label(frame.f_code))
+                frame, depth = frame.f_back, depth + 1
+            if labels:
+                _self_samples[f"{labels[0]} [{names.get(tid, tid)}]"] += 1
+                _inclusive_samples.update(set(labels))
+        _sample_count += 1
+        time.sleep(interval)
+
+def start(interval=PROFILE_SAMPLE_INTERVAL) -> None:
+    global _active, _sampler, _started, _sample_count
+    if _active:
+        return
+    _spans.clear()
+    _self_samples.clear()
+    _inclusive_samples.clear()
+    _sample_count, _started, _active = 0, time.perf_counter(), True
+    _sampler = threading.Thread(target=_sample_loop, args=(interval,), name="profiler-sampler", daemon=True)
+    _sampler.start()
+
+def stop(path=None):
+    """End the capture and write `<path>.json` (Chrome trace) and `<path>.txt`. Returns the paths."""
+    global _active
+    if not _active:
+        return None
+    _active = False
+    _sampler.join()
+    duration = time.perf_counter() - _started
+    path = path or f"{PROFILE_PATH}-{time.strftime('%Y%m%d-%H%M%S')}"
+    spans, names = list(_spans), dict(_thread_names)
+    pid = os.getpid()
+
+    events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+              for tid, name in names.items()]
+    for name, cat, t0, t1, tid, arg in spans:
+        event = {"name": name, "cat": cat, "ph": "X", "pid": pid, "tid": tid,
+                 "ts": (t0 - _started) * 1e6, "dur": (t1 - t0) * 1e6}
+        if arg is not None:
+            event["args"] = {"arg": str(arg)}
+        events.append(event)
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    totals = defaultdict(lambda: [0.0, 0])
+    for name, cat, t0, t1, _, _ in spans:
+        totals[f"{cat}/{name}"][0] += (t1 - t0) * 1000.0
+        totals[f"{cat}/{name}"][1] += 1
+    lines = [f"Capture: {duration:.2f}s, {len(spans)} spans, {_sample_count} sample rounds", "",
+             f"{'total ms':>10} {'count':>7} {'avg ms':>8}  span"]
+    for key, (total, count) in sorted(totals.items(), key=lambda kv: -kv[1][0])[:PROFILE_TOP_N]:
+        lines.append(f"{total:>10.1f} {count:>7} {total / count:>8.3f}  {key}")
+    total_samples = max(1, sum(_self_samples.values()))
+    for title, samples in (("self [thread]", _self_samples), ("inclusive", _inclusive_samples)):
+        lines += ["", f"{'samples':>10} {'share':>7}  function ({title})"]
+        for label, count in samples.most_common(PROFILE_TOP_N):
+            lines.append(f"{count:>10} {count / total_samples:>7.1%}  {label}")
+    with open(path + ".txt", "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path + ".json", path + ".txt"
+
+def toggle():
+    """Start a capture, or stop the running one and return its output paths."""
+    if _active:
+        return stop()
+    start()
+    return None
@@ -1,46 +1,189 @@
 import threading
 import queue
-import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 import requests
-from config import RDAP_ENDPOINTS, RDAP_REQUEST_TIMEOUT, RDAP_WORKER_THROTTLE
+from requests.adapters import HTTPAdapter
+from config import RDAP_ENDPOINTS, RDAP_REQUEST_TIMEOUT, RDAP_MAX_CONCURRENCY, RDAP_HOST_CONCURRENCY
 from cache import LRUCache
 from countries import translate_country
 from rdap_registry import IANA_IPV4_REGISTRY
+from rdap_bootstrap import get_bootstrap
+from rdap_store import RDAPStore
+from rdap_index import RDAPRangeIndex, key_range
+from profiler import span
 
 rdap_cache = LRUCache()
+rdap_index = RDAPRangeIndex()
 rdap_q = queue.Queue()
 RDAP_WORKER_SHUTDOWN = object()
+_results_version = 0
+
+_store_lock = threading.Lock()
+
+class RDAPFetcher:
+    """Runs RDAP lookups on a bounded thread pool.
+
+    Every registry host gets its own keep-alive session and a cap on concurrent
+    requests; max_workers caps lookups overall. Each query goes to the endpoints
+    `route` returns for it (the authoritative registry) and only falls back to
+    the other endpoints if those fail. Lookups can be cancelled: ones still
+    waiting for a thread are dropped, running ones stop before their next
+    endpoint and report nothing. With a `store`, fresh stored responses are
+    served without a request, answers (including 'no data') are written back,
+    and a stale copy is used when no registry can be reached. Pass other
+    endpoints and route=None (e.g. for a local stub server) to test against.
+    """
+    def __init__(self, endpoints=RDAP_ENDPOINTS, on_result=None, max_workers=RDAP_MAX_CONCURRENCY,
+                 per_host=RDAP_HOST_CONCURRENCY, timeout=RDAP_REQUEST_TIMEOUT, route=None, store=None):
+        self.endpoints, self.on_result, self.route, self.store = list(endpoints), on_result, route, store
+        self.per_host, self.timeout = per_host, timeout
+        self.pool = ThreadPoolExecutor(max_workers, thread_name_prefix="rdap-fetch")
+        self.pending = {}
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.per_host)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers["User-Agent"] = "clipmap-rdap/1.0"
+                self._hosts[host] = (session, threading.BoundedSemaphore(self.per_host))
+            return self._hosts[host]
+
+    def endpoints_for(self, query):
+        first = self.route(query) if self.route else []
+        tried = {urlsplit(tmpl).netloc for tmpl in first}
+        return first + [tmpl for tmpl in self.endpoints if urlsplit(tmpl).netloc not in tried]
+
+    def fetch(self, query, cancelled=None, endpoints=None):
+        """(JSON of the first 200 response or None, whether that result is an answer).
+
+        Only a 200 with valid JSON or a 404 from every registry tried counts;
+        errors, throttling and unparseable bodies leave the result unanswered.
+        """
+        endpoints = endpoints or self.endpoints_for(query)
+        answered = bool(endpoints)
+        for tmpl in endpoints:
+            if cancelled is not None and cancelled.is_set():
+                return None, False
+            url = tmpl.format(query)
+            session, slots = self._host(url)
+            with slots:
+                try:
+                    with span("fetch", "rdap", url):
+                        r = session.get(url, timeout=self.timeout)
+                    if r.status_code == 200:
+                        return r.json(), True
+                    answered = answered and r.status_code == 404
+                except (requests.RequestException, ValueError):
+                    answered = False
+        return None, answered
+
+    def _run(self, key, query, cancelled):
+        with span("lookup", "rdap", key):
+            stored = self.store.get(key) if self.store else None
+            if stored and stored[1]:
+                result = stored[0]
+            else:
+                result, answered = self.fetch(query, cancelled)
+                if cancelled.is_set():
+                    return
+                if self.store and answered:
+                    self.store.put(key, result)
+                elif stored:
+                    # Registries unreachable or erroring: keep serving the stale entry.
+                    result = stored[0]
+        if not cancelled.is_set() and self.on_result:
+            self.on_result(key, result)
+
+    def _finished(self, key, future):
+        with self._lock:
+            if self.pending.get(key, (None,))[0] is future:
+                del self.pending[key]
+
+    def submit(self, key, query):
+        """Start a lookup; returns its future, or None if the key is already in flight."""
+        with self._lock:
+            if key in self.pending:
+                return None
+            cancelled = threading.Event()
+            future = self.pool.submit(self._run, key, query, cancelled)
+            self.pending[key] = (future, cancelled)
+        future.add_done_callback(lambda f: self._finished(key, f))
+        return future
+
+    def cancel(self, keep=()):
+        """Cancel every pending lookup whose key is not in `keep`."""
+        with self._lock:
+            stale = [entry for key, entry in self.pending.items() if key not in keep]
+        for future, cancelled in stale:
+            cancelled.set()
+            future.cancel()
+
+    def shutdown(self):
+        self.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+def _store_result(key, result):
+    global _results_version
+    with _store_lock:
+        rdap_cache.put(key, result)
+        rdap_index.add(key, result)
+        _results_version += 1
+
+fetcher = RDAPFetcher(on_result=_store_result, route=lambda query: get_bootstrap().endpoints(query), store=RDAPStore())
 
 def rdap_worker():
-    session = requests.Session()
-    headers = {"User-Agent": "clipmap-rdap/1.0"}
+    # Feeds rdap_q into the fetcher; each item counts as done once its lookup finishes.
     while True:
         try:
             item = rdap_q.get(timeout=1.0)
-            if item is RDAP_WORKER_SHUTDOWN:
-                break
-            key, query = item
-            
-            if not rdap_cache.contains(key):
-                result = None
-                for tmpl in RDAP_ENDPOINTS:
-                    try:
-                        r = session.get(tmpl.format(query), headers=headers, timeout=RDAP_REQUEST_TIMEOUT)
-                        if r.status_code == 200:
-                            result = r.json()
-                            break
-                    except requests.RequestException:
-                        continue
-                
-                rdap_cache.put(key, result)
-                time.sleep(RDAP_WORKER_THROTTLE)
-                
-            rdap_q.task_done()
         except queue.Empty:
             continue
+        if item is RDAP_WORKER_SHUTDOWN:
+            rdap_q.task_done()
+            fetcher.shutdown()
+            break
+        key, query = item
+        if rdap_cache.contains(key) or (future := fetcher.submit(key, query)) is None:
+            rdap_q.task_done()
+        else:
+            future.add_done_callback(lambda _: rdap_q.task_done())
+
+def rdap_results_version():
+    return _results_version
+
+def rdap_pending():
+    return rdap_q.unfinished_tasks
+
+def rdap_busy():
+    return rdap_pending() > 0
+
+def rdap_resolve(key):
+    """(found, response) for an ip:/net: key: its own entry, else the most specific
+    cached network that answers it. A net: prefix is only answered by a network
+    whose original query lies inside it (the registry would return the same one);
+    an address by any cached network containing it."""
+    if rdap_cache.contains(key):
+        return True, rdap_cache.get(key)
+    try:
+        lo, hi = key_range(key)
+    except ValueError:
+        return False, None
+    if (hit := rdap_index.covering(lo, hi, exact=key.startswith("net:"), alive=rdap_cache.contains)) is None:
+        return False, None
+    return True, rdap_cache.get(hit)
+
+def cancel_rdap_queries(keep=()):
+    fetcher.cancel(set(keep))
 
 def enqueue_rdap_query(key, query):
-    if rdap_cache.contains(key) or (key.startswith("net:") and str(query).strip().endswith("/8")):
+    if rdap_resolve(key)[0] or (key.startswith("net:") and str(query).strip().endswith("/8")):
         return
     try:
         rdap_q.put_nowait((key, query))
@@ -139,5 +282,5 @@ for octet, info in IANA_IPV4_REGISTRY.items():
         "source": "iana-registry"
     })
 
-_worker_thread = threading.Thread(target=rdap_worker, daemon=True)
+_worker_thread = threading.Thread(target=rdap_worker, name="rdap-worker", daemon=True)
 _worker_thread.start()
\ No newline at end of file
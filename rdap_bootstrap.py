@@ -0,0 +1,135 @@
+"""IANA RDAP bootstrap (RFC 9224) for IPv4: which registry answers for an address.
+
+    python rdap_bootstrap.py refresh                  # download IANA's ipv4.json (registry-derived if offline)
+    python rdap_bootstrap.py refresh --from-registry  # rebuild from rdap_registry.py, offline
+    python rdap_bootstrap.py lookup 8.8.8.8
+
+The table ships as rdap_bootstrap.json. Lookups are longest-prefix matches
+over one dict per prefix length present in the file.
+"""
+import argparse
+import json
+import os
+import threading
+from config import RDAP_BOOTSTRAP_PATH, RDAP_BOOTSTRAP_URL
+from rdap_registry import IANA_IPV4_REGISTRY
+
+RIR_RDAP_URLS = {
+    "AFRINIC": "https://rdap.afrinic.net/rdap/",
+    "APNIC": "https://rdap.apnic.net/",
+    "ARIN": "https://rdap.arin.net/registry/",
+    "LACNIC": "https://rdap.lacnic.net/rdap/",
+    "RIPE NCC": "https://rdap.db.ripe.net/",
+}
+# Legacy /8s registered to an organisation rather than a registry; ARIN holds the rest of those.
+_LEGACY_RIR = {"Daimler AG": "RIPE NCC"}
+
+def _bootstrap_path(path=None):
+    path = path or RDAP_BOOTSTRAP_PATH
+    return path if os.path.isabs(path) else os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+
+def _parse_prefix(prefix):
+    addr, _, plen = prefix.strip().partition("/")
+    a, b, c, d = (int(p) for p in addr.split("."))
+    plen = int(plen) if plen else 32
+    mask = (0xFFFFFFFF << (32 - plen)) & 0xFFFFFFFF
+    return ((a << 24) | (b << 16) | (c << 8) | d) & mask, plen
+
+def registry_bootstrap():
+    """Bootstrap document derived from IANA_IPV4_REGISTRY designations (no network needed)."""
+    by_rir = {}
+    for octet, info in sorted(IANA_IPV4_REGISTRY.items()):
+        if info.get("status") == "RESERVED":
+            continue
+        designation = _LEGACY_RIR.get(info["designation"], info["designation"])
+        rir = next((name for name in RIR_RDAP_URLS if name in designation), "ARIN")
+        by_rir.setdefault(rir, []).append(f"{octet}.0.0.0/8")
+    return {"description": "RDAP bootstrap file for IPv4 address allocations, derived from the IANA IPv4 address space registry",
+            "publication": None, "version": "1.0",
+            "services": [[prefixes, [RIR_RDAP_URLS[rir]]] for rir, prefixes in sorted(by_rir.items())]}
+
+def download_bootstrap(url=RDAP_BOOTSTRAP_URL, timeout=15.0):
+    import requests
+    r = requests.get(url, timeout=timeout)
+    r.raise_for_status()
+    doc = r.json()
+    if not isinstance(doc.get("services"), list):
+        raise ValueError(f"{url} is not an RDAP bootstrap file")
+    return doc
+
+class RDAPBootstrap:
+    def __init__(self, doc):
+        self.tables = {}
+        for prefixes, urls in doc.get("services") or []:
+            # Prefer https, as the RFC suggests.
+            urls = sorted(urls, key=lambda u: not u.startswith("https"))
+            for prefix in prefixes:
+                net, plen = _parse_prefix(prefix)
+                self.tables.setdefault(plen, {})[net] = urls
+        self.lengths = sorted(self.tables, reverse=True)
+
+    @classmethod
+    def load(cls, path=None):
+        """The shipped table, or one derived from the registry if the file is missing or unreadable."""
+        try:
+            with open(_bootstrap_path(path), encoding="utf-8") as f:
+                return cls(json.load(f))
+        except (OSError, ValueError, TypeError):
+            return cls(registry_bootstrap())
+
+    def base_urls(self, query):
+        """Registry base URLs for an address or CIDR prefix (by its network address), most specific match."""
+        try:
+            addr, _ = _parse_prefix(str(query))
+        except ValueError:
+            return []
+        for plen in self.lengths:
+            if urls := self.tables[plen].get(addr & (0xFFFFFFFF << (32 - plen)) & 0xFFFFFFFF):
+                return urls
+        return []
+
+    def endpoints(self, query):
+        """Endpoint templates in the RDAP_ENDPOINTS format for `query`."""
+        return [url.rstrip("/") + "/ip/{}" for url in self.base_urls(query)]
+
+_bootstrap, _bootstrap_lock = None, threading.Lock()
+
+def get_bootstrap():
+    global _bootstrap
+    with _bootstrap_lock:
+        if _bootstrap is None:
+            _bootstrap = RDAPBootstrap.load()
+        return _bootstrap
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the IANA RDAP bootstrap table.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    refresh = sub.add_parser("refresh", help=f"download {RDAP_BOOTSTRAP_URL} into {RDAP_BOOTSTRAP_PATH}")
+    refresh.add_argument("--from-registry", action="store_true", help="derive the table from rdap_registry.py instead")
+    refresh.add_argument("--out", default=None, help=f"output path (default: {RDAP_BOOTSTRAP_PATH})")
+    lookup = sub.add_parser("lookup", help="show the registry endpoints for addresses or prefixes")
+    lookup.add_argument("queries", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "lookup":
+        table = RDAPBootstrap.load()
+        for query in args.queries:
+            print(f"{query}: {', '.join(table.endpoints(query)) or '(no registry)'}")
+        return
+
+    if args.from_registry:
+        doc = registry_bootstrap()
+    else:
+        try:
+            doc = download_bootstrap()
+        except Exception as e:
+            print(f"Could not fetch {RDAP_BOOTSTRAP_URL} ({e.__class__.__name__}); deriving the table from rdap_registry.py")
+            doc = registry_bootstrap()
+    out = args.out or _bootstrap_path()
+    with open(out + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=1)
+    os.replace(out + ".tmp", out)
+    print(f"Wrote {out}: {sum(len(prefixes) for prefixes, _ in doc['services'])} prefixes")
+
+if __name__ == "__main__":
+    main()
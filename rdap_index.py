@@ -0,0 +1,112 @@
+import threading
+from bisect import bisect_right
+
+def ipv4_to_int(s):
+    a, b, c, d = (int(p) for p in s.strip().split("."))
+    if not all(0 <= p <= 255 for p in (a, b, c, d)):
+        raise ValueError(s)
+    return (a << 24) | (b << 16) | (c << 8) | d
+
+def key_range(key):
+    """First and last address an `ip:` or `net:` cache key asks about."""
+    kind, _, query = key.partition(":")
+    addr, _, plen = query.partition("/")
+    lo = ipv4_to_int(addr)
+    if kind == "ip" or not plen:
+        return lo, lo
+    size = 1 << (32 - int(plen))
+    lo &= ~(size - 1) & 0xFFFFFFFF
+    return lo, lo + size - 1
+
+def response_range(j):
+    """IPv4 range an RDAP ip network object covers, from start/endAddress or cidr0_cidrs."""
+    try:
+        return ipv4_to_int(j["startAddress"]), ipv4_to_int(j["endAddress"])
+    except (KeyError, TypeError, ValueError, AttributeError):
+        pass
+    ranges = []
+    for c in j.get("cidr0_cidrs") or []:
+        try:
+            size = 1 << (32 - int(c["length"]))
+            ranges.append((ipv4_to_int(c["v4prefix"]), size))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+    if not ranges:
+        return None
+    return min(lo for lo, _ in ranges), max(lo + size - 1 for lo, size in ranges)
+
+class RDAPRangeIndex:
+    """Interval index over cached RDAP networks, keyed by integer address.
+
+    Networks are bucketed by size class (floor(log2(size))); each bucket is
+    sorted by start address, so a bisect finds the candidates and anything
+    covering an address lies at most one class-width back. Scanning classes
+    from small to large yields the most specific network first.
+    """
+    def __init__(self):
+        self.classes = {}
+        self.by_key = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, j):
+        if not j or j.get("source") == "iana-registry" or (span := response_range(j)) is None:
+            return
+        try:
+            query = key_range(key)
+        except ValueError:
+            return
+        start, end = span
+        cls = (end - start + 1).bit_length() - 1
+        with self._lock:
+            self._remove(key)
+            starts, entries = self.classes.setdefault(cls, ([], []))
+            i = bisect_right(starts, start)
+            starts.insert(i, start)
+            entries.insert(i, (end, key, query))
+            self.by_key[key] = (cls, start)
+
+    def _remove(self, key):
+        if (entry := self.by_key.pop(key, None)) is None:
+            return
+        cls, start = entry
+        starts, entries = self.classes[cls]
+        i = bisect_right(starts, start) - 1
+        while i >= 0 and starts[i] == start:
+            if entries[i][1] == key:
+                del starts[i], entries[i]
+                return
+            i -= 1
+
+    def discard(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def covering(self, lo, hi, exact=False, alive=None):
+        """Key of the most specific network covering [lo, hi], or None.
+
+        With exact, only networks whose own query lies inside [lo, hi] count -
+        for those the registry would give the same answer for [lo, hi]. Keys
+        that `alive` rejects (e.g. evicted from the cache) are dropped.
+        """
+        with self._lock:
+            for cls in sorted(self.classes):
+                starts, entries = self.classes[cls]
+                reach = 1 << (cls + 1)
+                best, i = None, bisect_right(starts, lo) - 1
+                while i >= 0 and starts[i] + reach > lo:
+                    end, key, (qlo, qhi) = entries[i]
+                    if alive is not None and not alive(key):
+                        del starts[i], entries[i]
+                        self.by_key.pop(key, None)
+                    elif end >= hi and (not exact or lo <= qlo and qhi <= hi):
+                        if best is None or end - starts[i] < best[0]:
+                            best = (end - starts[i], key)
+                    i -= 1
+                if best:
+                    return best[1]
+        return None
+
+    def clear(self):
+        with self._lock:
+            self.classes.clear()
+            self.by_key.clear()
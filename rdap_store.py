@@ -0,0 +1,102 @@
+"""Persistent RDAP response store shared across sessions (SQLite, WAL mode).
+
+    python rdap_store.py stats
+    python rdap_store.py compact                 # drop long-expired entries and vacuum
+    python rdap_store.py compact --drop-negative # also forget cached failures
+
+Entries keep the raw RDAP JSON (NULL for a negative result), the fetch time
+and an expiry. Expired entries are still returned, marked stale, so the
+viewer can show them when the registries are unreachable. The database is
+opened on first use, one connection per thread, so nothing touches the disk
+at startup and the frame loop never does.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from config import RDAP_STORE_PATH, RDAP_CACHE_TTL, RDAP_NEGATIVE_TTL, RDAP_STORE_KEEP_STALE
+
+_SCHEMA = """CREATE TABLE IF NOT EXISTS rdap (
+    key TEXT PRIMARY KEY,
+    body TEXT,
+    fetched REAL NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID"""
+
+class RDAPStore:
+    def __init__(self, path=RDAP_STORE_PATH):
+        self.path = path if os.path.isabs(path) else os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+        self._local = threading.local()
+
+    def _db(self):
+        if (db := getattr(self._local, "db", None)) is None:
+            db = sqlite3.connect(self.path, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(_SCHEMA)
+            self._local.db = db
+        return db
+
+    def get(self, key, now=None):
+        """(value, fresh) for a stored key - value None for a negative entry - or None if unknown."""
+        try:
+            row = self._db().execute("SELECT body, expires FROM rdap WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        try:
+            value = json.loads(row[0]) if row[0] is not None else None
+        except ValueError:
+            return None
+        return value, row[1] > (time.time() if now is None else now)
+
+    def put(self, key, value, now=None):
+        now = time.time() if now is None else now
+        ttl = RDAP_CACHE_TTL if value is not None else RDAP_NEGATIVE_TTL
+        try:
+            with self._db() as db:
+                db.execute("INSERT OR REPLACE INTO rdap (key, body, fetched, expires) VALUES (?, ?, ?, ?)",
+                           (key, json.dumps(value) if value is not None else None, now, now + ttl))
+        except sqlite3.Error:
+            pass
+
+    def stats(self, now=None):
+        now = time.time() if now is None else now
+        total, negative, stale = self._db().execute(
+            "SELECT COUNT(*), COUNT(*) - COUNT(body), SUM(expires <= ?) FROM rdap", (now,)).fetchone()
+        return {"entries": total, "negative": negative, "stale": stale or 0,
+                "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0}
+
+    def compact(self, keep_stale=RDAP_STORE_KEEP_STALE, drop_negative=False, now=None):
+        """Delete entries expired for longer than keep_stale seconds (and negatives if asked), then vacuum."""
+        now = time.time() if now is None else now
+        db = self._db()
+        with db:
+            removed = db.execute("DELETE FROM rdap WHERE expires < ?", (now - keep_stale,)).rowcount
+            if drop_negative:
+                removed += db.execute("DELETE FROM rdap WHERE body IS NULL").rowcount
+        db.execute("VACUUM")
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or compact the persistent RDAP cache.")
+    parser.add_argument("command", choices=("stats", "compact"))
+    parser.add_argument("--path", default=RDAP_STORE_PATH, help=f"database (default: {RDAP_STORE_PATH})")
+    parser.add_argument("--keep-stale-days", type=float, default=RDAP_STORE_KEEP_STALE / 86400,
+                        help="keep entries this long past their expiry, for offline use")
+    parser.add_argument("--drop-negative", action="store_true", help="also remove cached failures")
+    args = parser.parse_args(argv)
+
+    store = RDAPStore(args.path)
+    if args.command == "compact":
+        removed = store.compact(args.keep_stale_days * 86400, args.drop_negative)
+        print(f"Removed {removed} entries")
+    s = store.stats()
+    print(f"{store.path}: {s['entries']} entries ({s['negative']} negative, {s['stale']} stale), {s['bytes'] / 1024:.0f} KiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import json
+import pygame
+
+# Input that moves the camera or opens the context menu; everything else is left out of recordings.
+RECORDED_EVENTS = {pygame.MOUSEBUTTONDOWN: "mousebuttondown", pygame.MOUSEBUTTONUP: "mousebuttonup",
+                   pygame.MOUSEMOTION: "mousemotion", pygame.MOUSEWHEEL: "mousewheel"}
+_EVENT_TYPES = {name: etype for etype, name in RECORDED_EVENTS.items()}
+_EVENT_FIELDS = ("pos", "rel", "button", "buttons", "x", "y")
+
+def event_to_dict(ev):
+    out = {"type": RECORDED_EVENTS[ev.type]}
+    for field in _EVENT_FIELDS:
+        if hasattr(ev, field):
+            value = getattr(ev, field)
+            out[field] = list(value) if isinstance(value, tuple) else value
+    return out
+
+def event_from_dict(d):
+    return pygame.event.Event(_EVENT_TYPES[d["type"]], {k: tuple(v) if isinstance(v, list) else v
+                                                        for k, v in d.items() if k != "type"})
+
+class EventRecorder:
+    """Records the running view's input, one entry per drawn frame, for benchmark.py to replay.
+
+    The file holds the screen size, the camera at the first recorded frame and,
+    per frame, the mouse position and the recorded events.
+    """
+    def __init__(self, path, screen_size):
+        self.path, self.size = path, list(screen_size)
+        self.start, self.frames = None, []
+
+    def record(self, cam, mouse_pos, events):
+        if self.start is None:
+            self.start = [cam.x, cam.y, cam.zoom]
+        self.frames.append({"mouse": list(mouse_pos),
+                            "events": [event_to_dict(ev) for ev in events if ev.type in RECORDED_EVENTS]})
+
+    def save(self):
+        if self.start is None:
+            return
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"size": self.size, "start": self.start, "frames": self.frames}, f)
+
+def load_recording(path):
+    """Returns (size, start, frames) with frames as [(mouse_pos, [events])]."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    frames = [(tuple(fr["mouse"]), [event_from_dict(e) for e in fr["events"]]) for fr in data["frames"]]
+    return tuple(data["size"]), tuple(data["start"]), frames
@@ -1,14 +1,39 @@
 import os
 import sys
+from cache import set_tile_source, set_manifest
+from config import MAX_LEVEL, TILE_PACK_PATH, TILE_ZIP_PATH, TILE_DATA_PATH, TILE_MANIFEST_PATH
+from datasource import DataTileSource
+from manifest import TileManifest
+from tile_sources import DirectoryTileSource, ZipTileSource
+from tilepack import PackTileSource
+
 def normalize_directory():
     # this cursedass code makes sure the main program knows where it's looking lol
     caller_path = sys._getframe(1).f_globals['__file__']
     os.chdir(os.path.dirname(os.path.abspath(caller_path)))
 
 def check_dirs():
-    for i in range(9):
+    for i in range(MAX_LEVEL + 1):
         dirname = f"level{i}"
-        assert os.path.isdir(dirname), f"Directory '{dirname}' not found in {os.getcwd()}. Did you forget to unzip colored.zip?"
+        assert os.path.isdir(dirname), f"Directory '{dirname}' not found in {os.getcwd()}, and {TILE_ZIP_PATH} is not a readable zip. Did you fetch colored.zip with git lfs?"
+
+def select_tile_source():
+    if DataTileSource.available(TILE_DATA_PATH):
+        return DataTileSource(TILE_DATA_PATH)
+    if PackTileSource.available(TILE_PACK_PATH):
+        return PackTileSource(TILE_PACK_PATH)
+    if DirectoryTileSource.available() or not ZipTileSource.available(TILE_ZIP_PATH):
+        check_dirs()
+        return DirectoryTileSource()
+    return ZipTileSource(TILE_ZIP_PATH)
+
+def check_manifest(source):
+    if source.name == "data" or not TileManifest.available(TILE_MANIFEST_PATH):
+        return None
+    manifest = TileManifest.load(TILE_MANIFEST_PATH)
+    problems = manifest.verify(source)
+    assert not problems, f"Tiles do not match {TILE_MANIFEST_PATH}:\n" + "\n".join(problems) + "\nRebuild it with: python manifest.py build"
+    return manifest
 
 def print_art():
     with open("art.txt") as f:
@@ -16,5 +41,7 @@ def print_art():
 
 def startup_procedure():
     normalize_directory()
-    check_dirs()
-    print_art()
\ No newline at end of file
+    source = select_tile_source()
+    set_tile_source(source)
+    set_manifest(check_manifest(source))
+    print_art()
@@ -0,0 +1,133 @@
+import io
+import mmap
+import os
+import re
+import struct
+import zipfile
+import zlib
+import pygame
+from config import MAX_LEVEL, TILE_ZIP_PATH
+
+TILE_NAME_RE = re.compile(r"(?:^|/)level(\d+)/tile_(\d+)_(\d+)\.png$")
+
+def tile_filename(level, tx, ty):
+    return os.path.join(f"level{level}", f"tile_{tx}_{ty}.png")
+
+def decode_tile(data):
+    """Decode encoded PNG bytes (bytes, memoryview, ...) into an unconverted Surface."""
+    if data is None:
+        return None
+    try:
+        return pygame.image.load(io.BytesIO(data), "tile.png")
+    except Exception:
+        return None
+
+class DirectoryTileSource:
+    """The original layout: level{N}/tile_{x}_{y}.png below the working directory."""
+    name = "directory"
+
+    def __init__(self, root="."):
+        self.root = root
+
+    @staticmethod
+    def available(root="."):
+        return all(os.path.isdir(os.path.join(root, f"level{i}")) for i in range(MAX_LEVEL + 1))
+
+    def read(self, level, tx, ty):
+        try:
+            with open(os.path.join(self.root, tile_filename(level, tx, ty)), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def load(self, level, tx, ty):
+        fn = os.path.join(self.root, tile_filename(level, tx, ty))
+        if not os.path.isfile(fn):
+            return None
+        try:
+            return pygame.image.load(fn)
+        except Exception:
+            return None
+
+    def keys(self, level):
+        try:
+            names = os.listdir(os.path.join(self.root, f"level{level}"))
+        except OSError:
+            return
+        for name in names:
+            if m := TILE_NAME_RE.search(f"level{level}/{name}"):
+                yield int(m.group(2)), int(m.group(3))
+
+class ZipTileSource:
+    """Serve tiles straight out of colored.zip without extracting it.
+
+    The central directory is scanned once and the (level, x, y) -> member offset
+    index is persisted next to the archive, keyed by the zip's size and mtime.
+    """
+    name = "zip"
+    INDEX_MAGIC = b"VTZIDX\0\1"
+    INDEX_HEADER, INDEX_ENTRY = struct.Struct("<8sQQI"), struct.Struct("<BIIQBII")
+    LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+
+    def __init__(self, path=TILE_ZIP_PATH):
+        self.path, self.index_path = path, path + ".idx"
+        st = os.stat(path)
+        self._stamp = (st.st_size, st.st_mtime_ns)
+        self.index = self._read_index() or self._build_index()
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+
+    @staticmethod
+    def available(path=TILE_ZIP_PATH):
+        return os.path.isfile(path) and zipfile.is_zipfile(path)
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+            magic, size, mtime, count = self.INDEX_HEADER.unpack_from(data, 0)
+            if magic != self.INDEX_MAGIC or (size, mtime) != self._stamp:
+                return None
+            entries = self.INDEX_ENTRY.iter_unpack(memoryview(data)[self.INDEX_HEADER.size:])
+            return {(level, tx, ty): rest for level, tx, ty, *rest in entries}
+        except (OSError, struct.error):
+            return None
+
+    def _build_index(self):
+        index = {}
+        with zipfile.ZipFile(self.path) as zf:
+            for info in zf.infolist():
+                if m := TILE_NAME_RE.search(info.filename):
+                    key = (int(m.group(1)), int(m.group(2)), int(m.group(3)))
+                    index[key] = (info.header_offset, info.compress_type, info.compress_size, info.file_size)
+        try:
+            with open(self.index_path + ".tmp", "wb") as f:
+                f.write(self.INDEX_HEADER.pack(self.INDEX_MAGIC, *self._stamp, len(index)))
+                for key, rest in index.items():
+                    f.write(self.INDEX_ENTRY.pack(*key, *rest))
+            os.replace(self.index_path + ".tmp", self.index_path)
+        except OSError:
+            pass
+        return index
+
+    def read(self, level, tx, ty):
+        if (entry := self.index.get((level, tx, ty))) is None:
+            return None
+        offset, method, csize, _ = entry
+        sig, *_, name_len, extra_len = self.LOCAL_HEADER.unpack_from(self._mm, offset)
+        if sig != 0x04034b50:
+            return None
+        start = offset + self.LOCAL_HEADER.size + name_len + extra_len
+        data = self._view[start:start + csize]
+        if method == zipfile.ZIP_STORED:
+            return data
+        if method == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(data, -15)
+        return None
+
+    def load(self, level, tx, ty):
+        return decode_tile(self.read(level, tx, ty))
+
+    def keys(self, level):
+        return ((tx, ty) for (lvl, tx, ty) in self.index if lvl == level)
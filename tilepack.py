@@ -0,0 +1,132 @@
+"""Packed tile archive: one file, mmap-ed, tiles stored in Hilbert order per level.
+
+Layout (little endian):
+    header      "<8sHHI"   magic, version, tile size, level count
+    level table "<IQ"      per level: tile count, offset of that level's index
+    tile data              encoded PNGs, level by level, Hilbert order of the tile grid
+    indexes     "<IQI"     per tile: hilbert index, data offset, data length (sorted)
+
+Build one from the unpacked pyramid with:  python tilepack.py [src_dir] [out.vtp]
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from config import TILE_SIZE, MAX_LEVEL, HILBERT_ORDER, TILE_PACK_PATH
+from hilbert import xy2d, d2xy
+from tile_sources import DirectoryTileSource, decode_tile
+
+PACK_MAGIC, PACK_VERSION = b"VTPACK\0\0", 1
+HEADER, LEVEL_ENTRY, INDEX_ENTRY = struct.Struct("<8sHHI"), struct.Struct("<IQ"), struct.Struct("<IQI")
+
+def tile_grid(level):
+    tile_world = TILE_SIZE << level
+    return tile_world, max(1, (1 << HILBERT_ORDER) // tile_world)
+
+def tile_hilbert_index(level, tx, ty):
+    """Hilbert index of a tile within its level, or None for tiles off the map."""
+    tile_world, n = tile_grid(level)
+    i, j = tx // tile_world, ty // tile_world
+    if not (0 <= i < n and 0 <= j < n):
+        return None
+    return xy2d(n, i, j)
+
+class PackTileSource:
+    name = "pack"
+
+    def __init__(self, path=TILE_PACK_PATH):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+        magic, version, tile_size, levels = HEADER.unpack_from(self._mm, 0)
+        if magic != PACK_MAGIC or version != PACK_VERSION or tile_size != TILE_SIZE:
+            raise ValueError(f"{path} is not a v{PACK_VERSION} tile pack for {TILE_SIZE}px tiles")
+        self.index = []
+        for level in range(levels):
+            count, offset = LEVEL_ENTRY.unpack_from(self._mm, HEADER.size + level * LEVEL_ENTRY.size)
+            entries = INDEX_ENTRY.iter_unpack(self._view[offset:offset + count * INDEX_ENTRY.size])
+            self.index.append({d: (off, length) for d, off, length in entries})
+
+    @staticmethod
+    def available(path=TILE_PACK_PATH):
+        return os.path.isfile(path)
+
+    def reopen(self):
+        # The archive is replaced atomically on rebuild; map the new file.
+        return PackTileSource(self.path)
+
+    def close(self):
+        # Slices handed out by read() keep the map alive until they are dropped.
+        self._view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+    def read(self, level, tx, ty):
+        if not 0 <= level < len(self.index) or (d := tile_hilbert_index(level, tx, ty)) is None:
+            return None
+        if (entry := self.index[level].get(d)) is None:
+            return None
+        off, length = entry
+        return self._view[off:off + length]
+
+    def load(self, level, tx, ty):
+        return decode_tile(self.read(level, tx, ty))
+
+    def keys(self, level):
+        if not 0 <= level < len(self.index):
+            return
+        tile_world, n = tile_grid(level)
+        for d in self.index[level]:
+            x, y = d2xy(n, d)
+            yield x * tile_world, y * tile_world
+
+def write_pack(source, out_path, levels=MAX_LEVEL + 1, progress=None):
+    tmp_path = out_path + ".tmp"
+    level_indexes = []
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(PACK_MAGIC, PACK_VERSION, TILE_SIZE, levels))
+        f.write(b"\0" * LEVEL_ENTRY.size * levels)
+        for level in range(levels):
+            entries = sorted((d, tx, ty) for tx, ty in source.keys(level)
+                             if (d := tile_hilbert_index(level, tx, ty)) is not None)
+            index = []
+            for d, tx, ty in entries:
+                if (data := source.read(level, tx, ty)) is None:
+                    continue
+                index.append((d, f.tell(), len(data)))
+                f.write(data)
+            level_indexes.append(index)
+            if progress:
+                progress(level, len(index))
+
+        table = []
+        for index in level_indexes:
+            table.append((len(index), f.tell()))
+            for entry in index:
+                f.write(INDEX_ENTRY.pack(*entry))
+        f.seek(HEADER.size)
+        for count, offset in table:
+            f.write(LEVEL_ENTRY.pack(count, offset))
+    os.replace(tmp_path, out_path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack the level{N}/ tile pyramid into a single mmap-able archive.")
+    parser.add_argument("src", nargs="?", default=".", help="directory containing level0..level8")
+    parser.add_argument("out", nargs="?", default=TILE_PACK_PATH, help="archive to write")
+    args = parser.parse_args(argv)
+
+    if not DirectoryTileSource.available(args.src):
+        sys.exit(f"No level0..level{MAX_LEVEL} directories in {args.src}")
+    t0 = time.perf_counter()
+    write_pack(DirectoryTileSource(args.src), args.out,
+               progress=lambda level, n: print(f"level{level}: {n} tiles"))
+    print(f"Wrote {args.out} ({os.path.getsize(args.out) / 2**20:.1f} MiB) in {time.perf_counter() - t0:.1f}s")
+
+if __name__ == "__main__":
+    main()
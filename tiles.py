@@ -1,29 +1,75 @@
 import math
 import pygame
-from cache import get_scaled_tile
+from cache import load_tile, get_scaled_tile, get_placeholder_tile, find_cached_ancestor, solid_tile_color, TILE_PENDING
 from ui import hex_to_rgb
-from config import TILE_SIZE, SUBNET_BORDER_WIDTH, COLOR_BORDER
+from config import TILE_SIZE, MAX_LEVEL, DEEP_ZOOM_SCALE_LIMIT, SUBNET_BORDER_WIDTH, COLOR_BORDER
 
 COLOR_BORDER_RGB = hex_to_rgb(COLOR_BORDER) if isinstance(COLOR_BORDER, str) else COLOR_BORDER
 
-def draw_visible_tiles(screen, cam_x, cam_y, zoom, screen_w, screen_h, level):
+def level_for_zoom(zoom):
+    return max(0, min(MAX_LEVEL, int(round(-math.log2(zoom)))))
+
+def visible_tile_keys(cam_x, cam_y, zoom, screen_w, screen_h, level):
+    tile_world = TILE_SIZE * (2 ** level)
+    x0, y0 = int(cam_x // tile_world) * tile_world, int(cam_y // tile_world) * tile_world
+    x1, y1 = cam_x + screen_w / zoom, cam_y + screen_h / zoom
+    return [(level, x, y) for y in range(y0, math.ceil(y1), tile_world)
+                          for x in range(x0, math.ceil(x1), tile_world)]
+
+def blit_visible_region(screen, surf, src, left, top, size, view):
+    # Nearest-neighbour scale only the source pixels that land inside view, so
+    # the work is bounded by the screen size rather than by the zoom level.
+    vx0, vy0 = max(0, view.left - left), max(0, view.top - top)
+    vx1, vy1 = min(size, view.right - left), min(size, view.bottom - top)
+    if vx0 >= vx1 or vy0 >= vy1:
+        return
+    scale = size / src.w
+    sx0, sy0 = int(vx0 / scale), int(vy0 / scale)
+    sx1, sy1 = min(src.w, math.ceil(vx1 / scale)), min(src.h, math.ceil(vy1 / scale))
+    dx0, dy0 = left + round(sx0 * scale), top + round(sy0 * scale)
+    dx1, dy1 = left + round(sx1 * scale), top + round(sy1 * scale)
+    region = surf.subsurface((src.x + sx0, src.y + sy0, sx1 - sx0, sy1 - sy0))
+    screen.blit(pygame.transform.scale(region, (dx1 - dx0, dy1 - dy0)), (dx0, dy0))
+
+def draw_visible_tiles(screen, cam_x, cam_y, zoom, screen_w, screen_h, level, view=None):
+    view = view or pygame.Rect(0, 0, screen_w, screen_h)
     tile_world = TILE_SIZE * (2 ** level)
-    wx0, wy0 = cam_x, cam_y
-    wx1, wy1 = cam_x + screen_w / zoom, cam_y + screen_h / zoom
+    wx0, wy0 = cam_x + view.left / zoom, cam_y + view.top / zoom
+    wx1, wy1 = cam_x + view.right / zoom, cam_y + view.bottom / zoom
     
     start_x = int(wx0 // tile_world) * tile_world
     start_y = int(wy0 // tile_world) * tile_world
     
     blit_size = max(1, int(TILE_SIZE * zoom * (2 ** level)))
+    deep_zoom = blit_size > DEEP_ZOOM_SCALE_LIMIT
     
+    pending = []
     y = start_y
-    while y <= wy1:
+    while y < wy1:
         x = start_x
-        while x <= wx1:
-            if surf := get_scaled_tile(level, x, y, blit_size, blit_size):
-                screen.blit(surf, (int((x - cam_x) * zoom), int((y - cam_y) * zoom)))
+        while x < wx1:
+            left, top = math.floor((x - cam_x) * zoom), math.floor((y - cam_y) * zoom)
+            if (color := solid_tile_color(level, x, y)) is not None:
+                screen.fill(color, pygame.Rect(left, top, blit_size, blit_size).clip(view))
+            elif deep_zoom:
+                base, src = load_tile(level, x, y), None
+                if base is TILE_PENDING:
+                    pending.append((level, x, y))
+                    base = None
+                    if found := find_cached_ancestor(level, x, y):
+                        _, base, src = found
+                if base:
+                    blit_visible_region(screen, base, src or base.get_rect(), left, top, blit_size, view)
+            else:
+                surf = get_scaled_tile(level, x, y, blit_size, blit_size)
+                if surf is TILE_PENDING:
+                    pending.append((level, x, y))
+                    surf = get_placeholder_tile(level, x, y, blit_size, blit_size)
+                if surf:
+                    screen.blit(surf, (left, top))
             x += tile_world
         y += tile_world
+    return pending
 
 def draw_subnet_border(screen, cam_x, cam_y, zoom, screen_w, screen_h, bx, by, block_size):
     left = int((bx - cam_x) * zoom)
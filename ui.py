@@ -1,4 +1,5 @@
 import os
+import time
 import pygame
 from config import *
 
@@ -34,6 +35,7 @@ def render_text_with_border(font: pygame.font.Font, text: str, color: tuple, bor
 OCTET_COLS = [hex_to_rgb(c) for c in (COLOR_OCTET_1, COLOR_OCTET_2, COLOR_OCTET_3, COLOR_OCTET_4)]
 DOT_COL = hex_to_rgb(COLOR_DOTS)
 INFO_TEXT_COL = hex_to_rgb(COLOR_INFO_TEXT)
+INFO_BG_RGBA = (*hex_to_rgb(COLOR_INFO_BG), 220) if isinstance(COLOR_INFO_BG, str) else (*COLOR_INFO_BG, 220)
 
 def render_ip_octets(screen: pygame.Surface, ip_str: str, screen_h: int, ip_font: pygame.font.Font, cached: dict) -> dict:
     if ip_str != cached.get("last_ip"):
@@ -53,9 +55,29 @@ def render_ip_octets(screen: pygame.Surface, ip_str: str, screen_h: int, ip_font
     
     return cached
 
-def hud_render(screen: pygame.Surface, hud_font: pygame.font.Font, clock: pygame.time.Clock, cache: dict, zoom: float, level: int) -> None:
+def hud_render(screen: pygame.Surface, hud_font: pygame.font.Font, clock: pygame.time.Clock, cache: dict, zoom: float, level: int, quality: str = None) -> None:
     hud_text = f"Zoom:{zoom:.3f} @ {level} - FPS:{clock.get_fps():.1f}"
+    if quality:
+        hud_text += f" - Quality:{quality}"
     if hud_text != cache.get("last_hud"):
         cache.update({"last_hud": hud_text, "surf": render_text_with_border(hud_font, hud_text, INFO_TEXT_COL, border=1)})
     if surf := cache.get("surf"):
-        screen.blit(surf, (6, 6))
\ No newline at end of file
+        screen.blit(surf, (6, 6))
+
+def render_stats_panel(screen: pygame.Surface, font: pygame.font.Font, stats, counters: dict, cache: dict) -> None:
+    now = time.time()
+    if now - cache.get("time", 0.0) >= FRAME_STATS_REFRESH:
+        lines = [f"{'stage':<10}{'avg':>7}{'p95':>7}{'p99':>7}  ms"]
+        for stage, s in stats.summary().items():
+            lines.append(f"{stage:<10}{s['avg']:>7.2f}{s['p95']:>7.2f}{s['p99']:>7.2f}")
+        lines += [""] + [f"{name}: {value}" for name, value in counters.items()]
+        surfs = [render_text_with_border(font, line, INFO_TEXT_COL, border=1) for line in lines]
+        w = max(s.get_width() for s in surfs) + 12
+        panel = pygame.Surface((w, sum(s.get_height() for s in surfs) + 12), pygame.SRCALPHA)
+        panel.fill(INFO_BG_RGBA)
+        y = 6
+        for surf in surfs:
+            panel.blit(surf, (6, y))
+            y += surf.get_height()
+        cache.update({"time": now, "surf": panel})
+    screen.blit(cache["surf"], (6, 32))